@@ -0,0 +1,57 @@
+import re
+from datetime import datetime, timedelta
+
+DEFAULT_TIMEZONE = "Asia/Vladivostok"
+
+# Месяц по первым трём буквам: «декабря», «дек», «декабрь»
+MONTHS = {
+    "янв": 1, "фев": 2, "мар": 3, "апр": 4, "май": 5, "мая": 5,
+    "июн": 6, "июл": 7, "авг": 8, "сен": 9, "окт": 10, "ноя": 11, "дек": 12,
+}
+RELATIVE_DAYS = (("послезавтра", 2), ("завтра", 1), ("сегодня", 0))
+
+_TIME = re.compile(r"(?<![\d.])(\d{1,2}):(\d{2})(?!\d)")
+_DATE_WORDS = re.compile(r"(?<!\d)(\d{1,2})\s+([а-яё]{3,})")
+_DATE_DIGITS = re.compile(r"(?<![\d:])(\d{1,2})\.(\d{1,2})(?:\.(\d{2}|\d{4}))?(?![\d:])")
+
+
+# === РАЗБОР ВРЕМЕНИ ЗАПИСИ ===
+# Клиент пишет время как удобно: «1 декабря, 10:00», «01.12 10:00»,
+# «завтра в 15:30». now — текущее время в часовом поясе студии; год без
+# явного указания — ближайший, при котором дата ещё не прошла.
+def parse_appointment(text, now):
+    text = (text or "").lower()
+    match = _TIME.search(text)
+    if not match:
+        return None
+    hour, minute = int(match.group(1)), int(match.group(2))
+    rest = text[:match.start()] + " " + text[match.end():]
+
+    year = None
+    for word, shift in RELATIVE_DAYS:
+        if word in rest:
+            day = now.date() + timedelta(days=shift)
+            year, month, day = day.year, day.month, day.day
+            break
+    else:
+        words = _DATE_WORDS.search(rest)
+        digits = _DATE_DIGITS.search(rest)
+        if words and words.group(2)[:3] in MONTHS:
+            day, month = int(words.group(1)), MONTHS[words.group(2)[:3]]
+        elif digits:
+            day, month = int(digits.group(1)), int(digits.group(2))
+            if digits.group(3):
+                year = int(digits.group(3))
+                year += 2000 if year < 100 else 0
+        else:
+            return None
+
+    try:
+        if year is not None:
+            return datetime(year, month, day, hour, minute, tzinfo=now.tzinfo)
+        result = datetime(now.year, month, day, hour, minute, tzinfo=now.tzinfo)
+        if result < now - timedelta(days=1):
+            result = datetime(now.year + 1, month, day, hour, minute, tzinfo=now.tzinfo)
+        return result
+    except ValueError:
+        return None
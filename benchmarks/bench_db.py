@@ -0,0 +1,94 @@
+# Задержка цикла событий при массовой отправке заказов:
+# старый путь (sqlite3.connect на каждый вызов прямо в корутине)
+# против OrderRepository с потоком-писателем.
+#
+#   python benchmarks/bench_db.py --orders 2000 --concurrency 200
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import OrderRepository
+
+DETAILS = "Студия: Алеутская улица, 2а\nРазмер: 10×15\nКол-во: 5\nБумага: Глянцевая\nСумма: 175 ₽"
+
+
+def blocking_init(path):
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE IF NOT EXISTS orders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, username TEXT,
+        service TEXT, details TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    conn.commit()
+    conn.close()
+
+
+def blocking_save(path, user_id):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute("INSERT INTO orders (user_id, username, service, details) VALUES (?, ?, ?, ?)",
+              (user_id, "bench", "photo_print", DETAILS))
+    conn.commit()
+    conn.close()
+
+
+async def lag_monitor(samples, stop, interval=0.001):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        t = loop.time()
+        await asyncio.sleep(interval)
+        samples.append((loop.time() - t - interval) * 1000)
+
+
+async def run(mode, path, orders, concurrency):
+    samples = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(lag_monitor(samples, stop))
+    sem = asyncio.Semaphore(concurrency)
+
+    if mode == "blocking":
+        blocking_init(path)
+
+        async def submit(i):
+            async with sem:
+                blocking_save(path, i)
+    else:
+        repo = OrderRepository(path)
+        await repo.init_db()
+
+        async def submit(i):
+            async with sem:
+                await repo.save_order(i, "bench", "photo_print", DETAILS)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(submit(i) for i in range(orders)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+    if mode != "blocking":
+        await repo.close()
+
+    samples.sort()
+    p99 = samples[int(len(samples) * 0.99) - 1] if samples else 0.0
+    print(f"{mode:>10}: {orders / elapsed:8.0f} заказов/с | лаг цикла "
+          f"p50={statistics.median(samples) if samples else 0:.2f} мс "
+          f"p99={p99:.2f} мс max={samples[-1] if samples else 0:.2f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+    for mode in ("blocking", "repository"):
+        with tempfile.TemporaryDirectory() as tmp:
+            asyncio.run(run(mode, os.path.join(tmp, "bench.db"), args.orders, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
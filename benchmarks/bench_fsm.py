@@ -0,0 +1,75 @@
+# Задержка get_state/set_state/update_data: MemoryStorage против SQLiteStorage
+# (горячий LRU-кэш и холодное чтение с диска).
+#
+#   python benchmarks/bench_fsm.py --keys 2000
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from db import OrderRepository
+from fsm_storage import SQLiteStorage
+
+
+async def measure(storage, keys):
+    results = {}
+    for name, op in (
+        ("set_state", lambda k: storage.set_state(k, "PhotoPrintStates:size")),
+        ("update_data", lambda k: storage.update_data(k, {"studio": "Алеутская улица, 2а", "quantity": 5})),
+        ("get_state", lambda k: storage.get_state(k)),
+        ("get_data", lambda k: storage.get_data(k)),
+    ):
+        samples = []
+        for key in keys:
+            started = time.perf_counter()
+            await op(key)
+            samples.append((time.perf_counter() - started) * 1_000_000)
+        samples.sort()
+        results[name] = (statistics.median(samples), samples[int(len(samples) * 0.99) - 1])
+    return results
+
+
+def report(title, results):
+    print(title)
+    for name, (p50, p99) in results.items():
+        print(f"  {name:>12}: p50={p50:8.1f} мкс  p99={p99:8.1f} мкс")
+
+
+async def run(count):
+    keys = [StorageKey(bot_id=1, chat_id=i, user_id=i) for i in range(count)]
+    report("MemoryStorage", await measure(MemoryStorage(), keys))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = OrderRepository(os.path.join(tmp, "bench.db"))
+        await repo.init_db()
+        storage = SQLiteStorage(repo, cache_size=count * 2)
+        report("SQLiteStorage (кэш)", await measure(storage, keys))
+        cold = SQLiteStorage(repo, cache_size=1)
+        samples = []
+        for key in keys:
+            started = time.perf_counter()
+            await cold.get_data(key)
+            samples.append((time.perf_counter() - started) * 1_000_000)
+        samples.sort()
+        report("SQLiteStorage (холодное чтение)",
+               {"get_data": (statistics.median(samples), samples[int(len(samples) * 0.99) - 1])})
+        await repo.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(run(args.keys))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Накладные расходы обработчика на выбор студии: старый путь (сборка
+# клавиатуры через ReplyKeyboardBuilder на каждый ответ + линейный поиск
+# студии по startswith) против реестра MenuRegistry.
+#
+#   python benchmarks/bench_keyboards.py --iterations 20000
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyboards import MenuRegistry, make_keyboard
+
+STUDIOS = {
+    "1": "Алеутская улица, 2а",
+    "2": "ТЦ «Берёзка», Русская улица, 16",
+    "3": "Некрасовский рынок, Некрасовская улица, 69",
+    "4": "ТЦ «Серп и Молот», улица Калинина, 275Б"
+}
+STUDIO_LABELS = {
+    "1": "1. Алеутская ул., 2а",
+    "2": "2. ТЦ Берёзка, Русская 16",
+    "3": "3. Некрасовский рынок, Некрасовская 69",
+    "4": "4. ТЦ Серп и Молот, Калинина 275Б"
+}
+PHOTO_SIZES = {"10×15": 35, "13×18": 50, "15×21": 70, "20×30": 120}
+INPUTS = ["4. ТЦ Серп и Молот, Калинина 275Б", "Не та кнопка", "1. Алеутская ул., 2а"]
+
+
+def legacy_update(text):
+    for key, addr in STUDIOS.items():
+        if text.startswith(f"{key}."):
+            return addr, make_keyboard(list(PHOTO_SIZES.keys()))
+    return None, make_keyboard(list(STUDIO_LABELS.values()))
+
+
+def registry_update(menus, text):
+    studio = menus.find_studio(text)
+    if studio:
+        return studio, menus.photo_size
+    return None, menus.studio
+
+
+def bench(fn, iterations):
+    started = time.perf_counter()
+    for i in range(iterations):
+        fn(INPUTS[i % len(INPUTS)])
+    return (time.perf_counter() - started) / iterations * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    menus = MenuRegistry([["A", "B"]], STUDIOS, STUDIO_LABELS, {}, PHOTO_SIZES,
+                         ["Глянцевая", "Матовая"], ["Чёрно-белая", "Цветная"], ["✏️ Другое"])
+    print(f"Сборка реестра при старте: {(time.perf_counter() - started) * 1000:.2f} мс")
+
+    before = bench(legacy_update, args.iterations)
+    after = bench(lambda text: registry_update(menus, text), args.iterations)
+    print(f"До:    {before:8.2f} мкс на обновление")
+    print(f"После: {after:8.2f} мкс на обновление ({before / after:.0f}× быстрее)")
+
+
+if __name__ == "__main__":
+    main()
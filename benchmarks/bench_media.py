@@ -0,0 +1,140 @@
+# Загрузка фото заказа и сборка ZIP против локального FakeBotAPI: скорость
+# скачивания с ограничением параллельности, дедупликация одинаковых файлов,
+# вытеснение из кэша и пик памяти при потоковой сборке архива в сравнении
+# с наивным вариантом «всё в BytesIO».
+#
+#   python benchmarks/bench_media.py --files 200 --size-kb 1024 --duplicates 0.2
+import argparse
+import asyncio
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from db import OrderRepository
+from fake_api import FakeBotAPI
+from media import MediaCache, MediaPipeline
+
+CHAT_ID = 1
+
+
+def make_files(api, count, size, duplicates, seed):
+    # Часть файлов — те же байты под другим file_id (клиент прислал фото повторно)
+    rnd = random.Random(seed)
+    originals = []
+    file_ids = []
+    for n in range(count):
+        file_id = f"photo-{n}"
+        if originals and rnd.random() < duplicates:
+            data = rnd.choice(originals)
+        else:
+            data = rnd.randbytes(size)
+            originals.append(data)
+        api.add_file(file_id, data)
+        file_ids.append(file_id)
+    return file_ids, len(originals)
+
+
+def seed_order(repo, file_ids):
+    with repo.transaction() as c:
+        c.execute("INSERT INTO orders (user_id, service, quantity) VALUES (1, 'photo_print', ?)", (len(file_ids),))
+        order_id = c.lastrowid
+        c.executemany("INSERT INTO photos (order_id, file_id) VALUES (?, ?)", [(order_id, f) for f in file_ids])
+        return order_id
+
+
+async def naive_zip(bot, file_ids):
+    # Как было бы без конвейера: каждый файл целиком в память, архив тоже
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for n, file_id in enumerate(file_ids):
+            archive.writestr(f"{n:03d}.jpg", (await bot.download(file_id)).read())
+    return buffer.getbuffer().nbytes
+
+
+async def run(args):
+    api = FakeBotAPI(port=args.api_port)
+    await api.start()
+    bot = Bot("123456:" + "A" * 35, session=AiohttpSession(api=TelegramAPIServer.from_base(api.base_url)))
+    file_ids, unique = make_files(api, args.files, args.size_kb * 1024, args.duplicates, args.seed)
+    total_mb = args.files * args.size_kb / 1024
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = OrderRepository(os.path.join(tmp, "bench.db"))
+        await repo.init_db()
+        order_id = await repo.run(seed_order, repo, file_ids)
+        cache = MediaCache(os.path.join(tmp, "media"), args.cache_mb * 1024 * 1024)
+        pipeline = MediaPipeline(bot, repo, cache, concurrency=args.concurrency)
+        await pipeline.start()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(pipeline.prefetch(file_id) for file_id in file_ids))
+        elapsed = time.perf_counter() - started
+        print(f"загрузка {args.files} файлов по {args.size_kb} КБ ({total_mb:.0f} МБ), "
+              f"параллельно {args.concurrency}: {elapsed:.2f} с, {total_mb / elapsed:.0f} МБ/с")
+        print(f"  уникальных {unique}, на диске {len(cache._entries)} файлов / {cache.size / 2 ** 20:.0f} МБ, "
+              f"кэш {cache.stats}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(pipeline.fetch(file_id) for file_id in file_ids))
+        print(f"повторный запрос всех файлов: {(time.perf_counter() - started) * 1000:.0f} мс, "
+              f"скачиваний с API всего {api.downloads}")
+
+        parts = await pipeline.zip_parts(order_id)
+        tracemalloc.start()
+        started = time.perf_counter()
+        streamed = 0
+        for part in parts:
+            async for chunk in part.read(bot):
+                streamed += len(chunk)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"потоковый ZIP: {len(parts)} арх., {streamed / 2 ** 20:.0f} МБ за {elapsed:.2f} с, "
+              f"пик памяти {peak / 2 ** 20:.1f} МБ")
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        size = await naive_zip(bot, file_ids)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"наивный ZIP в памяти: {size / 2 ** 20:.0f} МБ за {elapsed:.2f} с, пик памяти {peak / 2 ** 20:.1f} МБ")
+
+        # Архив доходит до Bot API целым
+        await bot.send_document(CHAT_ID, parts[0])
+        name, body = api.uploads[-1]
+        with zipfile.ZipFile(io.BytesIO(body)) as archive:
+            bad = archive.testzip()
+            print(f"отправлен {name}: {len(archive.namelist())} файлов, проверка {'OK' if bad is None else bad}")
+
+        await pipeline.close()
+        await repo.close()
+    await bot.session.close()
+    await api.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--size-kb", type=int, default=1024)
+    parser.add_argument("--duplicates", type=float, default=0.2, help="доля повторно присланных файлов")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--cache-mb", type=int, default=2048)
+    parser.add_argument("--api-port", type=int, default=18082)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Пересчёт тысяч исторических заказов: цикл quote() по одному заказу
+# против пакетного PriceTable.reprice() и сценарий «что если» (+10% к цене).
+#
+#   python benchmarks/bench_pricing.py --orders 200000
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pricing import PRICES_PATH, PriceTable, simulate
+
+
+def synthetic_orders(table, count, seed=1):
+    rnd = random.Random(seed)
+    services = ["photo_id", "photo_print", "document_print"]
+    orders = []
+    for _ in range(count):
+        service = rnd.choice(services)
+        options = (rnd.choice(["Глянцевая", "Матовая"]),) if service == "photo_print" else ()
+        orders.append((service, rnd.choice(["1", "2", "3", "4"]), rnd.choice(table.items(service)),
+                       rnd.randint(1, 200) if service != "photo_id" else 1, options))
+    return orders
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with open(PRICES_PATH, encoding="utf-8") as f:
+        data = json.load(f)
+    data["services"]["photo_print"]["tiers"] = [[50, 5], [100, 10]]
+    current = PriceTable.from_dict(data)
+    orders = synthetic_orders(current, args.orders)
+
+    started = time.perf_counter()
+    naive = [current.quote(s, item, qty, studio, opts).total for s, studio, item, qty, opts in orders]
+    naive_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batched = current.reprice(orders)
+    batched_s = time.perf_counter() - started
+    assert list(batched) == naive
+
+    for service in data["services"].values():
+        service["items"] = {k: (v * 11 // 10 if v else v) for k, v in service["items"].items()}
+    proposed = PriceTable.from_dict(data)
+    started = time.perf_counter()
+    result = simulate(orders, current, proposed)
+    simulate_s = time.perf_counter() - started
+
+    print(f"{args.orders} заказов")
+    print(f"  quote() по одному: {naive_s * 1000:8.1f} мс")
+    print(f"  reprice() пакетом: {batched_s * 1000:8.1f} мс ({naive_s / batched_s:.1f}× быстрее)")
+    print(f"  что если +10%:     {simulate_s * 1000:8.1f} мс, выручка {result['before']} → {result['after']} ₽")
+
+
+if __name__ == "__main__":
+    main()
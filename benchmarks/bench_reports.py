@@ -0,0 +1,99 @@
+# Отчёты /stats и /report на большой истории: разбор details регулярным
+# выражением, GROUP BY по orders и сводка daily_stats; цена триггеров на
+# запись заказа и потоковая выгрузка CSV за месяц.
+#
+#   python benchmarks/bench_reports.py --rows 1000000
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_schema import PRICE_LINE, generate
+from db import OrderRepository
+from reports import Reports
+
+START, END = date(2026, 12, 1), date(2026, 12, 31)
+
+
+def legacy(conn):
+    revenue = {}
+    for details, in conn.execute("SELECT details FROM orders WHERE created_at >= '2026-12-01'"):
+        match = PRICE_LINE.search(details)
+        if match:
+            revenue[details.split("\n", 1)[0]] = revenue.get(details.split("\n", 1)[0], 0) + int(match.group(1))
+    return revenue
+
+
+def grouped(conn):
+    return conn.execute('''SELECT studio, service, COUNT(*), SUM(price) FROM orders
+                           WHERE created_at >= '2026-12-01' GROUP BY studio, service''').fetchall()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        generate(path, args.rows, args.rows // 10)
+        repo = OrderRepository(path)
+        started = time.perf_counter()
+        await repo.init_db()
+        print(f"{args.rows} заказов, миграции со сводкой: {time.perf_counter() - started:.1f} с")
+        reports = Reports(repo, repo.timezone)
+
+        conn = repo.conn
+        print(f"  разбор details:      {await repo.run(timed, lambda: legacy(conn), args.repeat):9.2f} мс")
+        print(f"  GROUP BY по orders:  {await repo.run(timed, lambda: grouped(conn), args.repeat):9.2f} мс")
+        samples = []
+        for _ in range(args.repeat * 10):
+            started = time.perf_counter()
+            await reports.totals(START, END)
+            samples.append((time.perf_counter() - started) * 1000)
+        print(f"  сводка daily_stats:  {statistics.median(samples):9.2f} мс")
+
+        # Триггеры daily_stats в транзакции записи заказа
+        for label, sql in (("с триггерами", None), ("без триггеров", "DROP TRIGGER orders_stats_insert")):
+            if sql:
+                await repo.run(conn.execute, sql)
+            samples = []
+            for i in range(args.repeat * 50):
+                started = time.perf_counter()
+                await repo.save_order(i, "bench", "photo_print", "", studio="Алеутская улица, 2а", price=100)
+                samples.append((time.perf_counter() - started) * 1_000_000)
+            print(f"  save_order {label}: p50={statistics.median(samples):.0f} мкс")
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        size = 0
+        async for chunk in reports.export_csv(START, END):
+            size += len(chunk)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  CSV за декабрь: {size / 2 ** 20:.1f} МБ за {elapsed:.2f} с, пик памяти {peak / 2 ** 20:.1f} МБ")
+        await repo.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# Поиск, отмена и отчёт на синтетической БД из нескольких миллионов заказов:
+# старая схема (details-текст, без индексов) против схемы после миграций.
+#
+#   python benchmarks/bench_schema.py --rows 2000000
+import argparse
+import asyncio
+import os
+import random
+import re
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import OrderRepository
+
+STUDIOS = ["Алеутская улица, 2а", "ТЦ «Берёзка», Русская улица, 16",
+           "Некрасовский рынок, Некрасовская улица, 69", "ТЦ «Серп и Молот», улица Калинина, 275Б"]
+SERVICES = ["photo_id", "photo_print", "document_print", "souvenirs"]
+PRICE_LINE = re.compile(r"Сумма: (\d+)")
+
+
+def generate(path, rows, users, seed=1):
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute('''CREATE TABLE orders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, username TEXT,
+        service TEXT, details TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    conn.execute("CREATE TABLE photos (order_id INTEGER, file_id TEXT)")
+    batch, photos = [], []
+    for i in range(1, rows + 1):
+        service = rnd.choice(SERVICES)
+        qty = rnd.randint(1, 10)
+        total = qty * rnd.choice((35, 50, 70, 120))
+        details = (f"Студия: {rnd.choice(STUDIOS)}\nРазмер: 10×15\nКол-во: {qty}\n"
+                   f"Бумага: Глянцевая\nСумма: {total} ₽")
+        created = f"2026-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d} {rnd.randint(9, 20):02d}:00:00"
+        batch.append((i, rnd.randrange(users), f"user{i}", service, details, created))
+        if service == "photo_print":
+            photos.extend((i, f"file{i}_{n}") for n in range(min(qty, 3)))
+        if len(batch) >= 50000:
+            conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?, ?, ?)", batch)
+            conn.executemany("INSERT INTO photos VALUES (?, ?)", photos)
+            batch, photos = [], []
+    conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?, ?, ?)", batch)
+    conn.executemany("INSERT INTO photos VALUES (?, ?)", photos)
+    conn.commit()
+    conn.close()
+
+
+def timed(fn, repeat):
+    samples = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def legacy_report(conn):
+    revenue = {}
+    for service, details in conn.execute(
+            "SELECT service, details FROM orders WHERE created_at >= '2026-12-01'"):
+        match = PRICE_LINE.search(details)
+        revenue[service] = revenue.get(service, 0) + (int(match.group(1)) if match else 0)
+    return revenue
+
+
+def structured_report(conn):
+    return dict(conn.execute(
+        "SELECT service, SUM(price) FROM orders WHERE created_at >= '2026-12-01' GROUP BY service"))
+
+
+def run_queries(conn, rows, users, report, repeat):
+    rnd = random.Random(2)
+    user_ids = [rnd.randrange(users) for _ in range(repeat)]
+    cancel_ids = [rnd.randint(1, rows) for _ in range(repeat)]
+    lookup = timed(lambda i: conn.execute(
+        "SELECT id, service, created_at FROM orders WHERE user_id = ? ORDER BY created_at DESC LIMIT 10",
+        (user_ids[i],)).fetchall(), repeat)
+
+    def cancel(i):
+        conn.execute("DELETE FROM orders WHERE id = ?", (cancel_ids[i],))
+        conn.execute("DELETE FROM photos WHERE order_id = ?", (cancel_ids[i],))
+        conn.commit()
+    cancel_ms = timed(cancel, repeat)
+    report_ms = timed(lambda i: report(conn), max(1, repeat // 5))
+    return lookup, cancel_ms, report_ms
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        started = time.perf_counter()
+        generate(path, args.rows, args.users)
+        print(f"Сгенерировано {args.rows} заказов за {time.perf_counter() - started:.1f} с")
+
+        conn = sqlite3.connect(path)
+        legacy = run_queries(conn, args.rows, args.users, legacy_report, args.repeat)
+        conn.close()
+
+        async def upgrade():
+            repo = OrderRepository(path)
+            started = time.perf_counter()
+            await repo.init_db()
+            elapsed = time.perf_counter() - started
+            await repo.close()
+            return elapsed
+        print(f"Миграция с бэкфиллом: {asyncio.run(upgrade()):.1f} с")
+
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA foreign_keys=ON")
+        structured = run_queries(conn, args.rows, args.users, structured_report, args.repeat)
+        conn.close()
+
+    print(f"{'запрос':>10} | {'старая схема':>14} | {'после миграций':>14}")
+    for name, before, after in zip(("поиск", "отмена", "отчёт"), legacy, structured):
+        print(f"{name:>10} | {before:11.2f} мс | {after:11.2f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# Локальная имитация Telegram Bot API для бенчмарков: отдаёт обновления через
+# getUpdates, принимает setWebhook и запоминает все исходящие запросы бота.
+# Файлы, добавленные через add_file, отдаются по getFile и /file/bot<token>/…
+import asyncio
+import itertools
+import time
+
+from aiohttp import web
+
+BOT_USER = {"id": 1000, "is_bot": True, "first_name": "A1", "username": "a1_test_bot"}
+
+
+def make_user(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+
+class FakeBotAPI:
+    def __init__(self, host="127.0.0.1", port=8081):
+        self.host = host
+        self.port = port
+        self.updates = []
+        self.calls = []
+        self.webhook_url = None
+        self.ready = asyncio.Event()
+        self.replies = {}
+        self.files = {}
+        self.downloads = 0
+        self.uploads = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._new_updates = asyncio.Event()
+        self._runner = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def text_update(self, user_id, text):
+        update_id = next(self._update_ids)
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": make_user(user_id),
+                "text": text,
+            },
+        }
+
+    def push(self, update):
+        self.updates.append(update)
+        self._new_updates.set()
+
+    def add_file(self, file_id, data, unique_id=None):
+        self.files[file_id] = (unique_id or file_id, data)
+
+    def reply_queue(self, chat_id):
+        return self.replies.setdefault(int(chat_id), asyncio.Queue())
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        for value in params.values():
+            if hasattr(value, "file"):  # загруженный файл (aiogram кладёт его в attach://…)
+                self.uploads.append((value.filename, value.file.read()))
+        self.calls.append((method, params, time.perf_counter()))
+        if method == "getMe":
+            return self.ok(BOT_USER)
+        if method == "getUpdates":
+            return self.ok(await self.get_updates(params))
+        if method == "setWebhook":
+            self.webhook_url = params.get("url")
+            self.ready.set()
+            return self.ok(True)
+        if method == "getFile":
+            if params.get("file_id") not in self.files:
+                return web.json_response({"ok": False, "error_code": 400,
+                                          "description": "Bad Request: invalid file_id"}, status=400)
+            unique_id, data = self.files[params["file_id"]]
+            return self.ok({"file_id": params["file_id"], "file_unique_id": unique_id,
+                            "file_size": len(data), "file_path": f"files/{params['file_id']}"})
+        if method in ("sendMessage", "sendDocument", "sendPhoto"):
+            chat_id = int(params["chat_id"])
+            self.reply_queue(chat_id).put_nowait(time.perf_counter())
+            return self.ok({
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params.get("text", ""),
+            })
+        return self.ok(True)
+
+    async def download(self, request):
+        entry = self.files.get(request.match_info["path"].rsplit("/", 1)[-1])
+        if entry is None:
+            return web.Response(status=404)
+        self.downloads += 1
+        response = web.StreamResponse(headers={"Content-Length": str(len(entry[1]))})
+        await response.prepare(request)
+        for start in range(0, len(entry[1]), 65536):
+            await response.write(entry[1][start:start + 65536])
+        await response.write_eof()
+        return response
+
+    async def get_updates(self, params):
+        self.ready.set()
+        offset = int(params.get("offset") or 0)
+        timeout = min(float(params.get("timeout") or 0), 1.0)
+        self.updates = [u for u in self.updates if u["update_id"] >= offset]
+        if not self.updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.updates[:100]
+
+    @staticmethod
+    def ok(result):
+        return web.json_response({"ok": True, "result": result})
+
+    async def start(self):
+        app = web.Application(client_max_size=60 * 2 ** 20)  # sendDocument до 50 МБ
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        app.router.add_get("/file/bot{token}/{path:.+}", self.download)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
@@ -0,0 +1,124 @@
+# Нагрузочный генератор: запускает бота (main.py) против локального FakeBotAPI
+# и прогоняет сценарий «Фото на документы» для многих пользователей.
+# Задержка — от отправки обновления (POST на вебхук или выдача в getUpdates)
+# до первого ответа бота этому пользователю.
+#
+#   python benchmarks/loadgen.py --mode both --users 200
+import argparse
+import asyncio
+import os
+import secrets
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_api import FakeBotAPI
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADMIN_ID = 1
+
+# (текст, сколько ответов пользователю ждать)
+SCENARIO = [
+    ("/start", 1),
+    ("📸 Фото на документы", 1),
+    ("1. Алеутская ул., 2а", 1),
+    ("3×4 см (паспорт РФ)", 1),
+    ("+79990000000", 1),
+    (None, 1),   # время записи — slot_text(); подтверждение вместе с меню
+]
+
+
+def slot_text(n):
+    # У каждого пользователя своё время записи, чтобы слоты не конфликтовали
+    day = date.today() + timedelta(days=2 + n // 40 % 50)
+    minute = 10 * 60 + n % 40 * 15
+    return f"{day:%d.%m.%Y} {minute // 60}:{minute % 60:02d}"
+
+
+async def wait_port(host, port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"Порт {port} не открылся")
+
+
+async def run_mode(mode, users, api_port, webhook_port, workers=1):
+    api = FakeBotAPI(port=api_port)
+    await api.start()
+    secret = secrets.token_hex(16)
+    env = dict(os.environ, BOT_TOKEN="123456:" + "A" * 35, ADMIN_ID=str(ADMIN_ID),
+               BOT_API_URL=api.base_url, BOT_MODE=mode,
+               WEBHOOK_URL=f"http://127.0.0.1:{webhook_port}", WEBHOOK_SECRET=secret,
+               WEBHOOK_HOST="127.0.0.1", WEBHOOK_PORT=str(webhook_port),
+               BOT_WORKERS=str(workers), METRICS_PORT="0")
+    workdir = tempfile.mkdtemp()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(ROOT, "main.py"), "--mode", mode, cwd=workdir, env=env,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+    session = aiohttp.ClientSession()
+    try:
+        await asyncio.wait_for(api.ready.wait(), 30)
+        if mode == "webhook":
+            await wait_port("127.0.0.1", webhook_port)
+
+        async def deliver(update):
+            if mode == "webhook":
+                async with session.post(api.webhook_url, json=update,
+                                        headers={"X-Telegram-Bot-Api-Secret-Token": secret}) as resp:
+                    resp.raise_for_status()
+            else:
+                api.push(update)
+
+        latencies = []
+
+        async def user_flow(user_id):
+            replies = api.reply_queue(user_id)
+            for text, expected in SCENARIO:
+                started = time.perf_counter()
+                await deliver(api.text_update(user_id, text or slot_text(user_id)))
+                first = await asyncio.wait_for(replies.get(), 30)
+                latencies.append((first - started) * 1000)
+                for _ in range(expected - 1):
+                    await asyncio.wait_for(replies.get(), 30)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user_flow(10_000 + i) for i in range(users)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await session.close()
+        proc.terminate()
+        await proc.wait()
+        await api.stop()
+
+    latencies.sort()
+    print(f"{mode:>8}: {len(latencies)} обновлений за {elapsed:.2f} с "
+          f"({len(latencies) / elapsed:.0f}/с) | p50={statistics.median(latencies):.1f} мс "
+          f"p99={latencies[int(len(latencies) * 0.99) - 1]:.1f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["polling", "webhook", "both"], default="both")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--api-port", type=int, default=18081)
+    parser.add_argument("--webhook-port", type=int, default=18080)
+    parser.add_argument("--workers", type=int, default=1, help="BOT_WORKERS для запускаемого бота")
+    args = parser.parse_args()
+    modes = ["polling", "webhook"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        asyncio.run(run_mode(mode, args.users, args.api_port, args.webhook_port, args.workers))
+
+
+if __name__ == "__main__":
+    main()
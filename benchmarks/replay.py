@@ -0,0 +1,378 @@
+# Офлайн-прогон настоящего dp/router на синтетических диалогах: обновления
+# подаются через dp.feed_raw_update, запросы к Bot API перехватывает
+# MockSession — сеть не нужна. Покрыты все сценарии: фото на документы,
+# фотопечать с N фото, распечатка, сувениры с макетом и без, отмена.
+# Результат сохраняется в JSON для сравнения между коммитами.
+#
+#   python benchmarks/replay.py --users 2000 --photos 5
+#   python benchmarks/replay.py --users 2000 --compare benchmarks/results/replay-abc1234.json
+#   python benchmarks/replay.py --users 2000 --api-latency 30 --workers 1,2,4,8
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import GetFile, SendMessage
+from aiogram.types import Chat, File, Message
+
+ADMIN_ID = 1
+FLOWS = ["photo_id", "photo_print", "document_print", "souvenir_file", "souvenir_no_file", "cancel"]
+
+
+# === ИМИТАЦИЯ BOT API ===
+class MockSession(BaseSession):
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = {}
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        name = method.__api_method__
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(method, SendMessage):
+            return Message(message_id=next(self._message_ids), date=int(time.time()),
+                           chat=Chat(id=int(method.chat_id), type="private"), text=method.text)
+        if isinstance(method, GetFile):
+            return File(file_id=method.file_id, file_unique_id=method.file_id, file_path=f"files/{method.file_id}")
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b"\xff\xd8" + url.encode() * 32  # у каждого файла своё содержимое
+
+    async def close(self):
+        pass
+
+
+# === СЦЕНАРИИ ===
+class UpdateFactory:
+    def __init__(self):
+        self._ids = itertools.count(1)
+
+    def _message(self, user_id, **content):
+        update_id = next(self._ids)
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}",
+                         "username": f"user{user_id}"},
+                **content,
+            },
+        }
+
+    def text(self, user_id, text):
+        return self._message(user_id, text=text)
+
+    def photo(self, user_id, n):
+        return self._message(user_id, photo=[{
+            "file_id": f"photo-{user_id}-{n}", "file_unique_id": f"u{user_id}-{n}", "width": 1280, "height": 960,
+        }])
+
+    def document(self, user_id):
+        return self._message(user_id, document={
+            "file_id": f"doc-{user_id}", "file_unique_id": f"d{user_id}", "file_name": "layout.pdf",
+        })
+
+
+def slot_text(n):
+    # У каждого пользователя своё время записи, чтобы слоты не конфликтовали
+    day = date.today() + timedelta(days=2 + n // 40 % 50)
+    minute = 10 * 60 + n % 40 * 15
+    return f"{day:%d.%m.%Y} {minute // 60}:{minute % 60:02d}"
+
+
+def build_scenario(factory, flow, user_id, photos, rnd):
+    t = lambda text: factory.text(user_id, text)
+    studio = rnd.choice(["1. Алеутская ул., 2а", "2. ТЦ Берёзка, Русская 16",
+                         "3. Некрасовский рынок, Некрасовская 69", "4. ТЦ Серп и Молот, Калинина 275Б"])
+    steps = [t("/start")]
+    if flow == "photo_id":
+        steps += [t("📸 Фото на документы"), t(studio), t("3×4 см (паспорт РФ)"),
+                  t("+79990000000"), t(slot_text(user_id))]
+    elif flow == "photo_print":
+        steps += [t("🖨️ Фотопечать"), t(studio), t("10×15"), t(str(photos)), t("Матовая")]
+        steps += [factory.photo(user_id, n) for n in range(photos)]
+    elif flow == "document_print":
+        steps += [t("📄 Распечатка документов"), t(studio), t("Цветная"), t("12")]
+    elif flow == "souvenir_file":
+        steps += [t("👕 Сувениры"), t("☕ Кружка"), t("2"), t("Синяя, надпись «A1»"), factory.document(user_id)]
+    elif flow == "souvenir_no_file":
+        steps += [t("👕 Сувениры"), t("👕 Футболка"), t("1"), t("Размер M"), t("Без макета")]
+    elif flow == "cancel":
+        steps += [t("🖨️ Фотопечать"), t(studio), t("13×18"), t("❌ Отмена")]
+    return steps
+
+
+def build_scenarios(users, photos, seed=1):
+    rnd = random.Random(seed)
+    factory = UpdateFactory()
+    return [(FLOWS[i % len(FLOWS)], 100_000 + i,
+             build_scenario(factory, FLOWS[i % len(FLOWS)], 100_000 + i, photos, rnd))
+            for i in range(users)]
+
+
+def percentile(samples, q):
+    return samples[min(len(samples) - 1, int(len(samples) * q))] if samples else 0.0
+
+
+def db_size(path):
+    return sum(os.path.getsize(p) for p in (path, path + "-wal", path + "-shm") if os.path.exists(p))
+
+
+def completed_orders(path):
+    conn = sqlite3.connect(path)
+    try:
+        return dict(conn.execute("SELECT service, COUNT(*) FROM orders GROUP BY service"))
+    finally:
+        conn.close()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def configure_env(db_path):
+    # Всё, что create_app() читает из окружения: без сети, без метрик на порту,
+    # без ограничений флуда (их проверяет отдельный сценарий, а не нагрузка)
+    os.environ.update({
+        "BOT_TOKEN": "123456:" + "A" * 35,
+        "ADMIN_ID": str(ADMIN_ID),
+        "DB_PATH": db_path,
+        "MEDIA_DIR": os.path.join(os.path.dirname(db_path), "media"),
+        "METRICS_PORT": "0",
+        "METRICS_LOG_INTERVAL": "0",
+        "THROTTLE_USER_LIMIT": "1000000/1",
+        "THROTTLE_GLOBAL_LIMIT": "1000000/1",
+    })
+
+
+# === ПРОГОН ===
+async def run_inprocess(scenarios, db_path, api_latency, concurrency):
+    configure_env(db_path)
+    import main
+
+    session = MockSession(latency=api_latency)
+    app = main.create_app(session=session)
+    await app.start()
+
+    latencies = {flow: [] for flow in FLOWS}
+    sem = asyncio.Semaphore(concurrency)
+
+    async def user_flow(flow, steps):
+        async with sem:
+            for update in steps:
+                started = time.perf_counter()
+                await app.dp.feed_raw_update(app.bot, update)
+                latencies[flow].append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user_flow(flow, steps) for flow, _, steps in scenarios))
+    elapsed = time.perf_counter() - started
+    await app.close()
+    return latencies, elapsed, dict(session.calls)
+
+
+async def run_sharded(scenarios, db_path, api_latency, concurrency, workers):
+    # Тот же сценарий через sharding.Supervisor: N процессов, обновления
+    # распределяются по chat_id. Задержка — от dispatch до подтверждения
+    # из процесса-обработчика; следующий шаг пользователь шлёт после ответа
+    # на предыдущий, как в жизни.
+    configure_env(db_path)
+    import functools
+    import threading
+
+    import sharding
+    from db import OrderRepository
+
+    repo = OrderRepository(db_path)
+    await repo.init_db()
+    await repo.close()
+
+    loop = asyncio.get_running_loop()
+    context = sharding.multiprocessing.get_context("spawn")
+    events = context.Queue()
+    supervisor = sharding.Supervisor(workers, events=events,
+                                     session_factory=functools.partial(MockSession, latency=api_latency))
+    waiting = {}
+    ready = asyncio.Event()
+    ready_count = 0
+    calls = {}
+    calls_reported = asyncio.Event()
+    reported = 0
+
+    def on_event(event):
+        nonlocal ready_count, reported
+        kind, key, value = event
+        if kind == "done":
+            future = waiting.pop(key, None)
+            if future is not None and not future.done():
+                future.set_result(value)
+        elif kind == "ready":
+            ready_count += 1
+            if ready_count == workers:
+                ready.set()
+        elif kind == "calls":
+            for name, n in value.items():
+                calls[name] = calls.get(name, 0) + n
+            reported += 1
+            if reported == workers:
+                calls_reported.set()
+
+    def reader():
+        while True:
+            event = events.get()
+            if event is None:
+                break
+            loop.call_soon_threadsafe(on_event, event)
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    await supervisor.start()
+    await ready.wait()
+
+    latencies = {flow: [] for flow in FLOWS}
+    sem = asyncio.Semaphore(concurrency)
+
+    async def user_flow(flow, steps):
+        async with sem:
+            for update in steps:
+                future = waiting[update["update_id"]] = loop.create_future()
+                started = time.monotonic()
+                supervisor.dispatch(update)
+                done_at = await future
+                latencies[flow].append((done_at - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user_flow(flow, steps) for flow, _, steps in scenarios))
+    elapsed = time.perf_counter() - started
+    await supervisor.stop()
+    await asyncio.wait_for(calls_reported.wait(), 10)
+    events.put(None)
+    thread.join()
+    return latencies, elapsed, calls
+
+
+def summarize(latencies, elapsed, calls, db_path, args, workers=None):
+    everything = sorted(itertools.chain.from_iterable(latencies.values()))
+    orders = completed_orders(db_path)
+    completed = sum(orders.values())
+    result = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"users": args.users, "photos": args.photos, "concurrency": args.concurrency,
+                   "api_latency_ms": args.api_latency, "workers": workers},
+        "updates": len(everything),
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_sec": round(len(everything) / elapsed, 1),
+        "latency_ms": {"p50": round(percentile(everything, 0.5), 3),
+                       "p99": round(percentile(everything, 0.99), 3),
+                       "max": round(everything[-1], 3) if everything else 0.0},
+        "flows": {flow: {"updates": len(s), "p50_ms": round(percentile(sorted(s), 0.5), 3),
+                         "p99_ms": round(percentile(sorted(s), 0.99), 3)}
+                  for flow, s in latencies.items() if s},
+        # Для нескольких процессов — максимум по процессу, а не сумма
+        "peak_rss_mb": round(max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                                 resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024, 1),
+        "db_size_bytes": db_size(db_path),
+        "orders": orders,
+        "api_calls": calls,
+        "api_calls_per_order": round(sum(calls.values()) / completed, 2) if completed else None,
+    }
+    return result
+
+
+def print_result(result, baseline=None):
+    workers = result["config"].get("workers")
+    mode = f"{workers} процесс(а/ов)" if workers else "в одном процессе"
+    print(f"коммит {result['commit']}, {mode}: {result['updates']} обновлений за {result['elapsed_s']} с "
+          f"→ {result['updates_per_sec']}/с")
+    print(f"  задержка p50={result['latency_ms']['p50']} мс p99={result['latency_ms']['p99']} мс "
+          f"max={result['latency_ms']['max']} мс")
+    print(f"  пик RSS {result['peak_rss_mb']} МБ, БД {result['db_size_bytes'] / 1024:.0f} КБ, "
+          f"заказов {sum(result['orders'].values())}, запросов к API на заказ {result['api_calls_per_order']}")
+    for flow, stats in result["flows"].items():
+        print(f"  {flow:>17}: p50={stats['p50_ms']} мс p99={stats['p99_ms']} мс")
+    if baseline:
+        print(f"сравнение с {baseline['commit']}:")
+        for label, path in (("обновлений/с", ("updates_per_sec",)), ("p50, мс", ("latency_ms", "p50")),
+                            ("p99, мс", ("latency_ms", "p99")), ("пик RSS, МБ", ("peak_rss_mb",)),
+                            ("запросов/заказ", ("api_calls_per_order",))):
+            old, new = baseline, result
+            for key in path:
+                old, new = old[key], new[key]
+            change = (new - old) / old * 100 if old else 0.0
+            print(f"  {label:>14}: {old} → {new} ({change:+.1f}%)")
+
+
+def save_result(result, output):
+    output = output or os.path.join(ROOT, "benchmarks", "results", f"replay-{result['commit']}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"результат: {output}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--photos", type=int, default=5, help="фото в заказе фотопечати")
+    parser.add_argument("--concurrency", type=int, default=2000, help="одновременно активных пользователей")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка имитации Bot API, мс")
+    parser.add_argument("--output", help="куда сохранить JSON")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", default="0",
+                        help="число процессов через запятую, например 1,2,4,8; 0 — в одном процессе без шардирования")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    scenarios = build_scenarios(args.users, args.photos, args.seed)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    counts = [int(n) for n in args.workers.split(",")]
+    results = []
+    for workers in counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "replay.db")
+            if workers:
+                run = run_sharded(scenarios, db_path, args.api_latency / 1000, args.concurrency, workers)
+            else:
+                run = run_inprocess(scenarios, db_path, args.api_latency / 1000, args.concurrency)
+            latencies, elapsed, calls = asyncio.run(run)
+            result = summarize(latencies, elapsed, calls, db_path, args, workers=workers or None)
+        print_result(result, baseline)
+        results.append(result)
+    if len(results) == 1:
+        save_result(results[0], args.output)
+    else:
+        save_result({"commit": results[0]["commit"], "runs": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import asyncio
+import bisect
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from datetime import time as day_time
+
+SLOT_MINUTES = 15
+OPENING_HOURS = (10 * 60, 20 * 60)   # минуты от полуночи по времени студии
+BOOKING_LEAD = 30 * 60               # раньше чем через полчаса не записываем
+BOOKING_HORIZON_DAYS = 60
+SUGGESTIONS = 6
+
+
+class SlotTaken(Exception):
+    pass
+
+
+def parse_hours(value, default=OPENING_HOURS):
+    # "10:00-20:00" -> (600, 1200)
+    if not value:
+        return default
+    try:
+        opens, closes = (int(h) * 60 + int(m) for h, m in (part.split(":") for part in value.split("-")))
+    except ValueError:
+        raise ValueError(f"Часы работы должны быть вида 10:00-20:00, получено {value!r}")
+    if not 0 <= opens < closes <= 24 * 60:
+        raise ValueError(f"Некорректные часы работы: {value!r}")
+    return opens, closes
+
+
+# === ЗАПИСЬ НА ФОТО НА ДОКУМЕНТЫ ===
+# Каждая запись занимает слот длиной slot_minutes, начало — на сетке от
+# открытия студии. Для каждой студии в памяти хранится отсортированный
+# список начал занятых слотов (unix-время): проверка «свободно ли» — два
+# bisect, подбор ближайших свободных — проход по сетке с такой проверкой.
+# Индекс строится из БД при старте. Бронь — это INSERT заказа с slot_at
+# под блокировкой студии; уникальный индекс (studio, slot_at) в БД ловит
+# гонку с другими процессами на той же базе (режим --workers).
+class Bookings:
+    def __init__(self, repo, timezone, slot_minutes=SLOT_MINUTES, hours=OPENING_HOURS,
+                 lead=BOOKING_LEAD, horizon_days=BOOKING_HORIZON_DAYS):
+        self.repo = repo
+        self.timezone = timezone
+        self.slot_minutes = slot_minutes
+        self.slot = slot_minutes * 60
+        self.opens, self.closes = hours
+        if self.closes - self.opens < slot_minutes:
+            raise ValueError(f"Слот {slot_minutes} мин не помещается в часы работы {_hhmm(self.opens)}-{_hhmm(self.closes)}")
+        self.lead = lead
+        self.horizon_days = horizon_days
+        self._slots = {}    # студия -> отсортированные начала занятых слотов
+        self._locks = {}
+        self.stats = {"booked": 0, "conflicts": 0, "rejected": 0}
+
+    # --- SQL (поток-писатель) ---
+    def _load(self, since, studio):
+        query = "SELECT studio, slot_at FROM orders WHERE slot_at IS NOT NULL AND slot_at >= ?"
+        params = [since]
+        if studio is not None:
+            query += " AND studio = ?"
+            params.append(studio)
+        return self.repo.conn.execute(query + " ORDER BY studio, slot_at", params).fetchall()
+
+    # --- индекс ---
+    async def load(self, studio=None):
+        rows = await self.repo.run(self._load, int(time.time()) - self.slot, studio)
+        if studio is None:
+            self._slots = {}
+        else:
+            self._slots[studio] = []
+        for name, start in rows:
+            self._slots.setdefault(name, []).append(start)
+
+    def is_free(self, studio, start):
+        # Занято, если чьё-то начало ближе длины слота с любой стороны
+        slots = self._slots.get(studio, ())
+        i = bisect.bisect_right(slots, start - self.slot)
+        return i == len(slots) or slots[i] >= start + self.slot
+
+    def check(self, studio, start, now=None):
+        # None — можно записать, иначе причина для клиента
+        now = time.time() if now is None else now
+        local = datetime.fromtimestamp(start, self.timezone)
+        minute = local.hour * 60 + local.minute
+        if start < now + self.lead:
+            return "Это время уже прошло или слишком близко"
+        if start > now + self.horizon_days * 86400:
+            return f"Запись открыта только на {self.horizon_days} дней вперёд"
+        if minute < self.opens or minute + self.slot_minutes > self.closes:
+            return f"Студия работает с {_hhmm(self.opens)} до {_hhmm(self.closes)}"
+        if local.second or (minute - self.opens) % self.slot_minutes:
+            return f"Запись идёт каждые {self.slot_minutes} минут"
+        if not self.is_free(studio, start):
+            return "Это время уже занято"
+        return None
+
+    def suggest(self, studio, after=None, count=SUGGESTIONS, now=None):
+        # Ближайшие свободные слоты не раньше after
+        now = time.time() if now is None else now
+        earliest = max(now + self.lead, after or 0)
+        day = datetime.fromtimestamp(earliest, self.timezone).date()
+        last = now + self.horizon_days * 86400
+        last_day = datetime.fromtimestamp(last, self.timezone).date()
+        found = []
+        while len(found) < count and day <= last_day:
+            for minute in range(self.opens, self.closes - self.slot_minutes + 1, self.slot_minutes):
+                start = int(datetime.combine(day, day_time(minute // 60, minute % 60), self.timezone).timestamp())
+                if start > last:
+                    return found
+                if start >= earliest and self.is_free(studio, start):
+                    found.append(start)
+                    if len(found) == count:
+                        break
+            day += timedelta(days=1)
+        return found
+
+    def _lock(self, studio):
+        lock = self._locks.get(studio)
+        if lock is None:
+            lock = self._locks[studio] = asyncio.Lock()
+        return lock
+
+    async def book(self, studio, start, user_id, username, details, **fields):
+        # Сохраняет заказ вместе со слотом -> id заказа; занято — SlotTaken
+        async with self._lock(studio):
+            problem = self.check(studio, start)
+            if problem:
+                self.stats["rejected"] += 1
+                raise SlotTaken(problem)
+            try:
+                order_id = await self.repo.save_order(user_id, username, "photo_id", details,
+                                                      studio=studio, slot_at=start, **fields)
+            except sqlite3.IntegrityError as e:
+                if "slot_at" not in str(e):
+                    raise
+                # Слот только что занял другой процесс: перечитываем студию
+                self.stats["conflicts"] += 1
+                await self.load(studio)
+                raise SlotTaken("Это время только что заняли")
+            slots = self._slots.setdefault(studio, [])
+            bisect.insort(slots, start)
+            # Прошедшие слоты больше не нужны
+            del slots[:bisect.bisect_left(slots, int(time.time()) - self.slot)]
+            self.stats["booked"] += 1
+            return order_id
+
+    def format(self, start):
+        return datetime.fromtimestamp(start, self.timezone).strftime("%d.%m.%Y %H:%M")
+
+
+def _hhmm(minute):
+    return f"{minute // 60:02d}:{minute % 60:02d}"
@@ -0,0 +1,142 @@
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from appointments import DEFAULT_TIMEZONE
+from migrations import ORDER_COLUMNS, migrate
+
+DB_PATH = "bot.db"
+
+
+# === ХРАНИЛИЩЕ ЗАКАЗОВ ===
+# Все обращения к SQLite выполняются в одном выделенном потоке с одним
+# долгоживущим соединением: цикл событий aiogram никогда не ждёт диск,
+# а запись сериализуется без блокировок на стороне Python.
+class OrderRepository:
+    def __init__(self, path=DB_PATH, timezone=None):
+        self.path = path
+        self.timezone = timezone or ZoneInfo(DEFAULT_TIMEZONE)  # для дня заказа в daily_stats
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-writer")
+        self._conn = None
+        self.observer = None  # observer(операция, время в потоке, полное ожидание)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        # Для новой БД; старую переводит python maintenance.py vacuum
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    @property
+    def conn(self):
+        # Соединение создаётся лениво внутри потока-писателя
+        if self._conn is None:
+            self._conn = self._connect()
+        return self._conn
+
+    async def run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        if self.observer is None:
+            return await loop.run_in_executor(self._executor, fn, *args)
+        executed = 0.0
+
+        def timed():
+            nonlocal executed
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                executed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._executor, timed)
+        finally:
+            self.observer(fn.__qualname__.replace("._", "."), executed, time.perf_counter() - started)
+
+    def transaction(self):
+        return _Transaction(self.conn)
+
+    # --- синхронные операции (выполняются только в потоке-писателе) ---
+    def _init_db(self):
+        return migrate(self)
+
+    def _save_order(self, user_id, username, service, details, fields):
+        unknown = set(fields) - set(ORDER_COLUMNS)
+        if unknown:
+            raise ValueError(f"Неизвестные поля заказа: {', '.join(sorted(unknown))}")
+        # Время и день задаём сами, чтобы день в сводке совпал с created_at
+        created = datetime.now(timezone.utc)
+        columns = ["user_id", "username", "service", "details", "created_at", "day", *fields]
+        placeholders = ", ".join("?" * len(columns))
+        with self.transaction() as c:
+            c.execute(f"INSERT INTO orders ({', '.join(columns)}) VALUES ({placeholders})",
+                      (user_id, username, service, details, created.strftime("%Y-%m-%d %H:%M:%S"),
+                       created.astimezone(self.timezone).date().isoformat(), *fields.values()))
+            return c.lastrowid
+
+    def _delete_order(self, order_id):
+        # Фото удаляются каскадом по внешнему ключу, daily_stats — триггером
+        with self.transaction() as c:
+            c.execute("DELETE FROM orders WHERE id = ?", (order_id,))
+
+    def _add_photos(self, order_id, file_ids):
+        with self.transaction() as c:
+            c.executemany("INSERT INTO photos (order_id, file_id) VALUES (?, ?)",
+                          [(order_id, file_id) for file_id in file_ids])
+
+    def _count_photos(self, order_id):
+        return self.conn.execute("SELECT COUNT(*) FROM photos WHERE order_id = ?", (order_id,)).fetchone()[0]
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # --- асинхронный интерфейс для обработчиков ---
+    async def init_db(self):
+        return await self.run(self._init_db)
+
+    async def save_order(self, user_id, username, service, details, **fields):
+        return await self.run(self._save_order, user_id, username, service, details, fields)
+
+    async def delete_order(self, order_id):
+        await self.run(self._delete_order, order_id)
+
+    async def add_photo(self, order_id, file_id):
+        await self.run(self._add_photos, order_id, [file_id])
+
+    async def add_photos(self, order_id, file_ids):
+        await self.run(self._add_photos, order_id, list(file_ids))
+
+    async def count_photos(self, order_id):
+        return await self.run(self._count_photos, order_id)
+
+    async def close(self):
+        await self.run(self._close)
+        self._executor.shutdown(wait=True)
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+        self.cursor = None
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.cursor = self.conn.cursor()
+        return self.cursor
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+        self.cursor.close()
+        return False
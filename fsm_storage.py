@@ -0,0 +1,157 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+
+FSM_STATE_TTL = 24 * 60 * 60
+FSM_CACHE_SIZE = 10000
+FSM_SWEEP_INTERVAL = 10 * 60
+
+
+class _Record:
+    __slots__ = ("state", "data", "updated_at")
+
+    def __init__(self, state=None, data=None, updated_at=0.0):
+        self.state = state
+        self.data = data or {}
+        self.updated_at = updated_at
+
+
+# === ХРАНИЛИЩЕ FSM В SQLITE ===
+# Состояния диалогов пишутся в таблицу fsm_state того же bot.db (write-through
+# через поток-писатель OrderRepository), поэтому переживают перезапуск.
+# Горячие записи держатся в LRU-кэше в памяти. Диалоги, не тронутые дольше
+# ttl секунд, считаются брошенными: они удаляются, а on_expire получает их
+# данные, чтобы убрать недооформленные заказы.
+class SQLiteStorage(BaseStorage):
+    def __init__(self, repo, ttl=FSM_STATE_TTL, cache_size=FSM_CACHE_SIZE,
+                 sweep_interval=FSM_SWEEP_INTERVAL, on_expire=None, key_builder=None):
+        self.repo = repo
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.sweep_interval = sweep_interval
+        self.on_expire = on_expire
+        self.key_builder = key_builder or DefaultKeyBuilder()
+        self._cache = OrderedDict()
+        self._sweeper = None
+
+    # --- кэш ---
+    def _remember(self, key, record):
+        self._cache[key] = record
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _load(self, key):
+        record = self._cache.get(key)
+        if record is None:
+            row = await self.repo.run(self._select, key)
+            record = _Record(row[0], json.loads(row[1]), row[2]) if row else _Record()
+        if record.updated_at and time.time() - record.updated_at > self.ttl:
+            # Истёкшая запись: её подберёт очистка, а диалог начинается заново
+            record = _Record()
+        self._remember(key, record)
+        return record
+
+    async def _store(self, key, record):
+        record.updated_at = time.time()
+        self._remember(key, record)
+        if record.state is None and not record.data:
+            await self.repo.run(self._delete, key)
+        else:
+            await self.repo.run(self._upsert, key, record.state,
+                                json.dumps(record.data, ensure_ascii=False), record.updated_at)
+
+    # --- SQL (поток-писатель) ---
+    def _select(self, key):
+        return self.repo.conn.execute(
+            "SELECT state, data, updated_at FROM fsm_state WHERE key = ?", (key,)).fetchone()
+
+    def _upsert(self, key, state, data, updated_at):
+        self.repo.conn.execute(
+            '''INSERT INTO fsm_state (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+               ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data,
+               updated_at = excluded.updated_at''',
+            (key, state, data, updated_at))
+
+    def _delete(self, key):
+        self.repo.conn.execute("DELETE FROM fsm_state WHERE key = ?", (key,))
+
+    def _pop_expired(self, deadline, limit):
+        with self.repo.transaction() as c:
+            rows = c.execute(
+                "SELECT key, state, data FROM fsm_state WHERE updated_at < ? LIMIT ?",
+                (deadline, limit)).fetchall()
+            c.executemany("DELETE FROM fsm_state WHERE key = ?", [(row[0],) for row in rows])
+        return rows
+
+    def _count_states(self):
+        return self.repo.conn.execute(
+            "SELECT state, COUNT(*) FROM fsm_state WHERE state IS NOT NULL GROUP BY state").fetchall()
+
+    # --- интерфейс BaseStorage ---
+    async def set_state(self, key, state=None):
+        key = self.key_builder.build(key)
+        record = await self._load(key)
+        record.state = state.state if isinstance(state, State) else state
+        await self._store(key, record)
+
+    async def get_state(self, key):
+        return (await self._load(self.key_builder.build(key))).state
+
+    async def set_data(self, key, data):
+        key = self.key_builder.build(key)
+        record = await self._load(key)
+        record.data = dict(data)
+        await self._store(key, record)
+
+    async def get_data(self, key):
+        return dict((await self._load(self.key_builder.build(key))).data)
+
+    async def update_data(self, key, data):
+        # Одна запись в БД вместо get_data + set_data
+        key = self.key_builder.build(key)
+        record = await self._load(key)
+        record.data = {**record.data, **data}
+        await self._store(key, record)
+        return dict(record.data)
+
+    # --- обслуживание ---
+    async def expire(self, batch=500):
+        deadline = time.time() - self.ttl
+        expired = 0
+        while True:
+            rows = await self.repo.run(self._pop_expired, deadline, batch)
+            for key, state, data in rows:
+                cached = self._cache.get(key)
+                if cached is not None and cached.updated_at >= deadline:
+                    continue
+                self._cache.pop(key, None)
+                if self.on_expire:
+                    await self.on_expire(state, json.loads(data))
+            expired += len(rows)
+            if len(rows) < batch:
+                return expired
+
+    async def count_states(self):
+        return dict(await self.repo.run(self._count_states))
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.expire()
+            except Exception as e:
+                print(f"Ошибка очистки FSM: {e}")
+
+    def start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
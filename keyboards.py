@@ -0,0 +1,77 @@
+from datetime import datetime
+
+from aiogram.filters.callback_data import CallbackData
+from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
+
+CANCEL = "❌ Отмена"
+WEEKDAYS = ("пн", "вт", "ср", "чт", "пт", "сб", "вс")
+
+
+def make_keyboard(buttons, with_cancel=True):
+    kb = ReplyKeyboardBuilder()
+    if buttons and isinstance(buttons[0], list):
+        for row in buttons:
+            for btn in row:
+                kb.button(text=btn)
+            kb.adjust(*[1]*len(row))
+    else:
+        for btn in buttons:
+            kb.button(text=btn)
+        kb.adjust(2)
+    if with_cancel:
+        kb.button(text=CANCEL)
+    return kb.as_markup(resize_keyboard=True, one_time_keyboard=False)
+
+
+# === РЕЕСТР МЕНЮ ===
+# Все клавиатуры собираются один раз (заново — только когда меняется
+# prices.json) и дальше только переиспользуются (разметку не изменять —
+# объекты общие для всех ответов).
+# Здесь же — таблицы «надпись кнопки → значение» для проверки ввода за O(1).
+class MenuRegistry:
+    def __init__(self, main_buttons, studios, studio_labels, id_photo_sizes, photo_sizes,
+                 paper_types, print_types, souvenir_types):
+        self.main = make_keyboard(main_buttons, with_cancel=False)
+        self.studio = make_keyboard(list(studio_labels.values()))
+        self.id_photo_size = make_keyboard(list(id_photo_sizes))
+        self.photo_size = make_keyboard(list(photo_sizes))
+        self.paper_type = make_keyboard(list(paper_types))
+        self.print_type = make_keyboard(list(print_types))
+        self.souvenir_type = make_keyboard(list(souvenir_types))
+        self.cancel_only = make_keyboard([])
+
+        self.studio_by_label = {label: studios[key] for key, label in studio_labels.items()}
+        self.studio_by_key = dict(studios)
+        self.id_photo_sizes = frozenset(id_photo_sizes)
+        self.photo_sizes = frozenset(photo_sizes)
+        self.paper_types = frozenset(paper_types)
+        self.print_types = frozenset(print_types)
+        self.souvenir_types = frozenset(souvenir_types)
+
+    def find_studio(self, text):
+        # Точная надпись кнопки или ввод вида «2. что угодно»
+        if not text:
+            return None
+        address = self.studio_by_label.get(text)
+        if address is None:
+            key, sep, _ = text.partition(".")
+            if sep:
+                address = self.studio_by_key.get(key)
+        return address
+
+
+# === СВОБОДНОЕ ВРЕМЯ ЗАПИСИ ===
+class SlotCallback(CallbackData, prefix="slot"):
+    at: int   # начало слота, unix-время
+
+
+def slot_keyboard(slots, timezone):
+    # Кнопки «ср 21.10 10:15» по две в ряд; пустой список — без клавиатуры
+    if not slots:
+        return None
+    kb = InlineKeyboardBuilder()
+    for start in slots:
+        local = datetime.fromtimestamp(start, timezone)
+        kb.button(text=f"{WEEKDAYS[local.weekday()]} {local:%d.%m %H:%M}", callback_data=SlotCallback(at=start))
+    kb.adjust(2)
+    return kb.as_markup()
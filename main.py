@@ -1,23 +1,43 @@
+import argparse
+import asyncio
 import os
-import sqlite3
+import signal
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
 from aiogram import Bot, Dispatcher, Router, F
-from aiogram.types import Message
-from aiogram.filters import Command
+from aiogram.types import CallbackQuery, Message
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.utils.keyboard import ReplyKeyboardBuilder
-from dotenv import load_dotenv
-
-# === ЗАГРУЗКА НАСТРОЕК ===
-load_dotenv()
-BOT_TOKEN = os.getenv("BOT_TOKEN")
-ADMIN_ID = int(os.getenv("ADMIN_ID"))
-
-bot = Bot(token=BOT_TOKEN)
-storage = MemoryStorage()
-dp = Dispatcher(storage=storage)
-router = Router()
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from appointments import parse_appointment
+from booking import Bookings, SlotTaken
+from db import OrderRepository
+from fsm_storage import SQLiteStorage
+from keyboards import MenuRegistry, SlotCallback, slot_keyboard
+from maintenance import Maintenance
+from media import UPLOAD_TIMEOUT, MediaCache, MediaPipeline
+from metrics import BotApiTimingMiddleware, HandlerTimingMiddleware, Metrics, observe_sqlite
+from notifications import AdminNotifier
+from outbound import BotApiSession, FloodControlMiddleware, send_together
+from photo_buffer import PhotoBuffer
+from pricing import PriceTable, UnknownItem, format_price
+from reports import CsvInputFile, Reports, format_totals, parse_day
+from settings import MODES, SettingsError, load_settings
+from throttling import ThrottlingMiddleware
+
+# При запуске скриптом (и в процессах-обработчиках sharding.py) модуль —
+# это __main__; псевдоним, чтобы "import main" не загружал его второй раз
+sys.modules.setdefault("main", sys.modules[__name__])
+
+# Импорт модуля ничего не создаёт и не читает окружение: бот, БД и
+# диспетчер появляются в create_app(), обработчики получают их через
+# workflow data диспетчера (аргумент app).
 
 # === КОНСТАНТЫ ===
 STUDIOS = {
@@ -27,16 +47,30 @@ STUDIOS = {
     "4": "ТЦ «Серп и Молот», улица Калинина, 275Б"
 }
 
-ID_PHOTO_SIZES = {
-    "3×4 см (паспорт РФ)": 350,
-    "35×45 мм (загранпаспорт)": 400,
-    "4×6 см (виза, международные)": 450,
-    "5×5 см (иные документы)": 450
+STUDIO_KEYS = {addr: key for key, addr in STUDIOS.items()}
+
+# Надписи кнопок выбора студии
+STUDIO_LABELS = {
+    "1": "1. Алеутская ул., 2а",
+    "2": "2. ТЦ Берёзка, Русская 16",
+    "3": "3. Некрасовский рынок, Некрасовская 69",
+    "4": "4. ТЦ Серп и Молот, Калинина 275Б"
+}
+
+MAIN_MENU_BUTTONS = [
+    ["📸 Фото на документы", "🖨️ Фотопечать"],
+    ["👕 Сувениры", "📄 Распечатка документов"]
+]
+PAPER_TYPES = ["Глянцевая", "Матовая"]
+
+# Названия услуг в отчётах (в БД — ключи)
+SERVICE_TITLES = {
+    "photo_id": "📸 Фото на документы",
+    "photo_print": "🖨️ Фотопечать",
+    "document_print": "📄 Распечатка документов",
+    "souvenirs": "👕 Сувениры",
 }
 
-PHOTO_SIZES = {"10×15": 35, "13×18": 50, "15×21": 70, "20×30": 120}
-MATTE_SURCHARGE = 10
-PRINT_PRICES = {"Чёрно-белая": 5, "Цветная": 15}
 
 # === СОСТОЯНИЯ ===
 class PhotoIDStates(StatesGroup):
@@ -63,211 +97,295 @@ class SouvenirStates(StatesGroup):
     description = State()
     waiting_for_file = State()
 
-# === УНИВЕРСАЛЬНЫЕ ФУНКЦИИ МЕНЮ ===
-def make_keyboard(buttons, with_cancel=True):
-    kb = ReplyKeyboardBuilder()
-    if isinstance(buttons[0], list):
-        for row in buttons:
-            for btn in row:
-                kb.button(text=btn)
-            kb.adjust(*[1]*len(row))
-    else:
-        for btn in buttons:
-            kb.button(text=btn)
-        kb.adjust(2)
-    if with_cancel:
-        kb.button(text="❌ Отмена")
-    return kb.as_markup(resize_keyboard=True, one_time_keyboard=False)
-
-def main_menu():
-    return make_keyboard([
-        ["📸 Фото на документы", "🖨️ Фотопечать"],
-        ["👕 Сувениры", "📄 Распечатка документов"]
-    ], with_cancel=False)
-
-def studio_menu():
-    return make_keyboard([
-        "1. Алеутская ул., 2а",
-        "2. ТЦ Берёзка, Русская 16",
-        "3. Некрасовский рынок, Некрасовская 69",
-        "4. ТЦ Серп и Молот, Калинина 275Б"
-    ])
-
-def id_photo_size_menu():
-    return make_keyboard(list(ID_PHOTO_SIZES.keys()))
-
-def photo_size_menu():
-    return make_keyboard(list(PHOTO_SIZES.keys()))
-
-def paper_type_menu():
-    return make_keyboard(["Глянцевая", "Матовая"])
-
-def print_type_menu():
-    return make_keyboard(["Чёрно-белая", "Цветная"])
-
-def souvenir_type_menu():
-    return make_keyboard(["👕 Футболка", "☕ Кружка", "🖼️ Фото на керамике", "✏️ Другое"])
-
-# === РАБОТА С БД ===
-def init_db():
-    conn = sqlite3.connect('bot.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS orders (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        username TEXT,
-        service TEXT,
-        details TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS photos (
-        order_id INTEGER,
-        file_id TEXT
-    )''')
-    conn.commit()
-    conn.close()
-
-def save_order(user_id, username, service, details):
-    conn = sqlite3.connect('bot.db')
-    c = conn.cursor()
-    c.execute("INSERT INTO orders (user_id, username, service, details) VALUES (?, ?, ?, ?)",
-              (user_id, username, service, details))
-    order_id = c.lastrowid
-    conn.commit()
-    conn.close()
-    return order_id
-
-def delete_order(order_id):
-    conn = sqlite3.connect('bot.db')
-    c = conn.cursor()
-    c.execute("DELETE FROM orders WHERE id = ?", (order_id,))
-    c.execute("DELETE FROM photos WHERE order_id = ?", (order_id,))
-    conn.commit()
-    conn.close()
+# === ОБРАБОТЧИКИ ===
+# Обработчики описываются на уровне модуля, а роутер собирается заново для
+# каждого приложения: Router aiogram можно подключить только к одному
+# диспетчеру, а create_app() вызывают и несколько раз (тесты, бенчмарки).
+class Handlers:
+    def __init__(self):
+        self._registered = []
+
+    def _on(self, event, filters):
+        def register(handler):
+            self._registered.append((event, handler, filters))
+            return handler
+        return register
+
+    def message(self, *filters):
+        return self._on("message", filters)
+
+    def callback_query(self, *filters):
+        return self._on("callback_query", filters)
+
+    def build_router(self):
+        router = Router()
+        for event, handler, filters in self._registered:
+            getattr(router, event).register(handler, *filters)
+        return router
+
+
+handlers = Handlers()
+
+# Шаг выбора позиции для каждой услуги: туда возвращаем клиента, если
+# выбранную позицию успели убрать из prices.json
+ITEM_STEPS = {
+    "photo_id": (PhotoIDStates.size, "id_photo_size"),
+    "photo_print": (PhotoPrintStates.size, "photo_size"),
+    "document_print": (DocumentPrintStates.print_type, "print_type"),
+    "souvenirs": (SouvenirStates.type, "souvenir_type"),
+}
+
+
+async def is_admin(event, app: "BotApp"):
+    # Фильтр команд для администраторов (главного и студий)
+    return event.from_user is not None and event.from_user.id in app.admin_ids
 
 # === ГЛОБАЛЬНЫЙ ОБРАБОТЧИК ОТМЕНЫ ===
-@router.message(F.text == "❌ Отмена")
-async def handle_cancel(message: Message, state: FSMContext):
+@handlers.message(F.text == "❌ Отмена")
+async def handle_cancel(message: Message, state: FSMContext, app: "BotApp"):
     current = await state.get_state()
     if current is None:
-        await message.answer("Вы в главном меню.", reply_markup=main_menu())
+        await message.answer("Вы в главном меню.", reply_markup=app.menus.main)
         return
 
     data = await state.get_data()
     order_id = data.get('order_id')
     if order_id:
-        delete_order(order_id)
+        app.photo_buffer.discard(order_id)
+        await app.repo.delete_order(order_id)
 
     await state.clear()
-    await message.answer("❌ Заказ отменён. Вы в главном меню.", reply_markup=main_menu())
+    await message.answer("❌ Заказ отменён. Вы в главном меню.", reply_markup=app.menus.main)
 
 # === КОМАНДА /start ===
-@router.message(Command("start"))
-async def cmd_start(message: Message, state: FSMContext):
+@handlers.message(Command("start"))
+async def cmd_start(message: Message, state: FSMContext, app: "BotApp"):
     await state.clear()
     await message.answer(
         "👋 Здравствуйте! Это официальный бот студии **A1** во Владивостоке.\n\n"
         "Выберите услугу:",
-        reply_markup=main_menu()
+        reply_markup=app.menus.main
     )
 
+# === КОМАНДА /files (администраторам) ===
+@handlers.message(Command("files"), is_admin)
+async def cmd_files(message: Message, command: CommandObject, app: "BotApp"):
+    if not command.args or not command.args.strip().isdigit():
+        await message.answer("Укажите номер заказа: /files 123")
+        return
+    order_id = int(command.args)
+    await message.answer(f"⏳ Собираю файлы заказа {order_id}…")
+    try:
+        parts = await app.media.zip_parts(order_id)
+    except Exception as e:
+        await message.answer(f"❌ Не удалось скачать файлы заказа {order_id}: {e}")
+        return
+    if parts is None:
+        await message.answer(f"❌ Заказ {order_id} не найден.")
+        return
+    if not parts:
+        await message.answer(f"В заказе {order_id} нет файлов.")
+        return
+    for part in parts:
+        await app.bot.send_document(message.chat.id, part, request_timeout=UPLOAD_TIMEOUT)
+
+# === КОМАНДЫ /stats И /report (администраторам) ===
+REPORT_STUDIO_LABELS = {STUDIOS[key]: label for key, label in STUDIO_LABELS.items()}
+
+@handlers.message(Command("stats"), is_admin)
+async def cmd_stats(message: Message, app: "BotApp"):
+    studios = app.admin_studios(message.from_user.id)
+    today = app.reports.today()
+    lines = []
+    for title, days in (("Сегодня", 1), ("30 дней", 30), ("7 дней", 7)):
+        rows = await app.reports.totals(today - timedelta(days=days - 1), today, studios)
+        # Разбивка по студиям и услугам — только за неделю
+        lines.append(format_totals(title, rows, REPORT_STUDIO_LABELS, SERVICE_TITLES, breakdown=days == 7))
+    await message.answer("📊 Статистика\n\n" + "\n".join(lines))
+
+@handlers.message(Command("report"), is_admin)
+async def cmd_report(message: Message, command: CommandObject, app: "BotApp"):
+    # /report [с] [по]; по умолчанию — с начала месяца по сегодня
+    today = app.reports.today()
+    args = (command.args or "").split()
+    start = parse_day(args[0], today) if args else today.replace(day=1)
+    end = parse_day(args[1], today) if len(args) > 1 else today
+    if start is None or end is None or start > end:
+        await message.answer("Формат: /report 01.10.2026 18.10.2026 (или без дат — текущий месяц)")
+        return
+    studios = app.admin_studios(message.from_user.id)
+    rows = await app.reports.totals(start, end, studios)
+    title = f"{start:%d.%m.%Y} — {end:%d.%m.%Y}"
+    await message.answer("📈 " + format_totals(title, rows, REPORT_STUDIO_LABELS, SERVICE_TITLES))
+    if rows:
+        document = CsvInputFile(lambda: app.reports.export_csv(start, end, studios),
+                                f"orders_{start}_{end}.csv")
+        await app.bot.send_document(message.chat.id, document, request_timeout=UPLOAD_TIMEOUT)
+
+async def item_unavailable(app, message: Message, state: FSMContext, service):
+    step, keyboard = ITEM_STEPS[service]
+    await state.set_state(step)
+    await message.answer("❌ Этой позиции больше нет в прайсе. Выберите из списка:",
+                         reply_markup=getattr(app.menus, keyboard))
+
 # === ФОТО НА ДОКУМЕНТЫ ===
-@router.message(F.text == "📸 Фото на документы")
-async def start_photo_id(message: Message, state: FSMContext):
+@handlers.message(F.text == "📸 Фото на документы")
+async def start_photo_id(message: Message, state: FSMContext, app: "BotApp"):
     await state.set_state(PhotoIDStates.studio)
-    await message.answer("📍 Выберите студию:", reply_markup=studio_menu())
+    await message.answer("📍 Выберите студию:", reply_markup=app.menus.studio)
 
-@router.message(PhotoIDStates.studio)
-async def photo_id_studio(message: Message, state: FSMContext):
+@handlers.message(PhotoIDStates.studio)
+async def photo_id_studio(message: Message, state: FSMContext, app: "BotApp"):
     if message.text == "❌ Отмена": return
-    for key, addr in STUDIOS.items():
-        if message.text.startswith(f"{key}."):
-            await state.update_data(studio=addr)
-            await state.set_state(PhotoIDStates.size)
-            await message.answer("📏 Выберите размер:", reply_markup=id_photo_size_menu())
-            return
-    await message.answer("❌ Пожалуйста, выберите студию из списка:", reply_markup=studio_menu())
+    studio = app.menus.find_studio(message.text)
+    if studio:
+        await state.update_data(studio=studio)
+        await state.set_state(PhotoIDStates.size)
+        await message.answer("📏 Выберите размер:", reply_markup=app.menus.id_photo_size)
+        return
+    await message.answer("❌ Пожалуйста, выберите студию из списка:", reply_markup=app.menus.studio)
 
-@router.message(PhotoIDStates.size)
-async def photo_id_size(message: Message, state: FSMContext):
+@handlers.message(PhotoIDStates.size)
+async def photo_id_size(message: Message, state: FSMContext, app: "BotApp"):
     if message.text == "❌ Отмена": return
-    if message.text not in ID_PHOTO_SIZES:
-        await message.answer("❌ Выберите размер из списка:", reply_markup=id_photo_size_menu())
+    if message.text not in app.menus.id_photo_sizes:
+        await message.answer("❌ Выберите размер из списка:", reply_markup=app.menus.id_photo_size)
         return
     await state.update_data(size=message.text)
     await state.set_state(PhotoIDStates.phone)
     await message.answer("📱 Введите ваш номер телефона (для связи и чека):")
 
-@router.message(PhotoIDStates.phone)
-async def photo_id_phone(message: Message, state: FSMContext):
+@handlers.message(PhotoIDStates.phone)
+async def photo_id_phone(message: Message, state: FSMContext, app: "BotApp"):
     if message.text == "❌ Отмена": return
     await state.update_data(phone=message.text)
     await state.set_state(PhotoIDStates.time)
-    await message.answer("⏰ Укажите дату и время (пример: *1 декабря, 10:00*):")
+    studio = (await state.get_data())['studio']
+    await message.answer("⏰ Укажите дату и время (пример: *1 декабря, 10:00*) или выберите ближайшее свободное:",
+                         reply_markup=slot_keyboard(app.bookings.suggest(studio), app.settings.timezone))
+
+async def offer_slots(app, message, studio, reason, after=None):
+    slots = app.bookings.suggest(studio, after)
+    if not slots:
+        await message.answer(f"❌ {reason}. Свободного времени в ближайшие дни нет — позвоните в студию.")
+        return
+    await message.answer(f"❌ {reason}. Ближайшее свободное время:", reply_markup=slot_keyboard(slots, app.settings.timezone))
 
-@router.message(PhotoIDStates.time)
-async def photo_id_time(message: Message, state: FSMContext):
-    if message.text == "❌ Отмена": return
+async def booking_data(state: FSMContext):
+    # Данные записи, если диалог всё ещё ждёт время; None — запись уже
+    # оформлена или отменена (например, кнопку слота нажали дважды)
+    if await state.get_state() != PhotoIDStates.time.state:
+        return None
     data = await state.get_data()
+    if not all(key in data for key in ('studio', 'size', 'phone')):
+        return None
+    return data
+
+async def book_photo_id(app, message: Message, user, state: FSMContext, data, start):
+    # Запись в выбранный слот; False — слот заняли, клиенту уже предложены другие.
+    # Вызывается под app.user_lock(user.id), data — из booking_data()
     studio = data['studio']
     size = data['size']
     phone = data['phone']
-    time = message.text
-    price = ID_PHOTO_SIZES[size]
+    time = app.bookings.format(start)
+    try:
+        price = app.prices.quote("photo_id", size, studio=STUDIO_KEYS.get(studio)).total
+    except UnknownItem:
+        await item_unavailable(app, message, state, "photo_id")
+        return False
     details = f"Студия: {studio}\nРазмер: {size}\nТелефон: {phone}\nВремя: {time}\nСумма: {price} ₽"
-    
-    save_order(message.from_user.id, message.from_user.username, "photo_id", details)
-    
-    await message.answer(
-        f"✅ Запись подтверждена!\n📍 {studio}\n💰 К оплате: {price} ₽\n\n"
-        "💳 Оплатите через СБП на наш номер. После оплаты пришлите скриншот."
-    )
-    await bot.send_message(ADMIN_ID, f"🆕 Фото на документы\n{details}")
+    try:
+        await app.bookings.book(studio, start, user.id, user.username, details, item=size, phone=phone,
+                                appointment_time=time, price=price, appointment_at=start)
+    except SlotTaken as e:
+        await offer_slots(app, message, studio, str(e), start)
+        return False
+
     await state.clear()
-    await message.answer("✅ Ваш заказ принят в работу!", reply_markup=main_menu())
+    # Подтверждение и меню — одним сообщением, параллельно с уведомлением админам
+    await send_together(
+        message.answer(
+            f"✅ Запись подтверждена!\n📍 {studio}\n⏰ {time}\n💰 К оплате: {price} ₽\n\n"
+            "💳 Оплатите через СБП на наш номер. После оплаты пришлите скриншот.\n\n"
+            "✅ Ваш заказ принят в работу!",
+            reply_markup=app.menus.main
+        ),
+        app.notify_admins(f"🆕 Фото на документы\n{details}", studio),
+    )
+    return True
+
+@handlers.message(PhotoIDStates.time)
+async def photo_id_time(message: Message, state: FSMContext, app: "BotApp"):
+    if message.text == "❌ Отмена": return
+    async with app.user_lock(message.from_user.id):
+        data = await booking_data(state)
+        if data is None:
+            return
+        appointment = parse_appointment(message.text, datetime.now(app.settings.timezone))
+        if appointment is None:
+            await offer_slots(app, message, data['studio'], "Не удалось разобрать дату и время")
+            return
+        await book_photo_id(app, message, message.from_user, state, data, int(appointment.timestamp()))
+
+@handlers.callback_query(PhotoIDStates.time, SlotCallback.filter())
+async def photo_id_slot(callback: CallbackQuery, callback_data: SlotCallback, state: FSMContext, app: "BotApp"):
+    # Повторное нажатие ждёт первое и видит уже завершённый диалог
+    async with app.user_lock(callback.from_user.id):
+        data = await booking_data(state)
+        if data is None:
+            await stale_slot(callback)
+            return
+        await callback.answer()
+        # Кнопки больше не нужны: при неудаче придут новые
+        await callback.message.edit_reply_markup(reply_markup=None)
+        await book_photo_id(app, callback.message, callback.from_user, state, data, callback_data.at)
+
+@handlers.callback_query(SlotCallback.filter())
+async def stale_slot(callback: CallbackQuery):
+    await callback.answer("Эта запись уже оформлена или отменена.", show_alert=True)
 
 # === ФОТОПЕЧАТЬ ===
-@router.message(F.text == "🖨️ Фотопечать")
-async def start_photo_print(message: Message, state: FSMContext):
+@handlers.message(F.text == "🖨️ Фотопечать")
+async def start_photo_print(message: Message, state: FSMContext, app: "BotApp"):
     await state.set_state(PhotoPrintStates.studio)
-    await message.answer("📍 Выберите студию:", reply_markup=studio_menu())
+    await message.answer("📍 Выберите студию:", reply_markup=app.menus.studio)
 
-@router.message(PhotoPrintStates.studio)
-async def print_studio(message: Message, state: FSMContext):
+@handlers.message(PhotoPrintStates.studio)
+async def print_studio(message: Message, state: FSMContext, app: "BotApp"):
     if message.text == "❌ Отмена": return
-    for key, addr in STUDIOS.items():
-        if message.text.startswith(f"{key}."):
-            await state.update_data(studio=addr)
-            await state.set_state(PhotoPrintStates.size)
-            await message.answer("📏 Выберите размер:", reply_markup=photo_size_menu())
-            return
-    await message.answer("❌ Выберите студию:", reply_markup=studio_menu())
+    studio = app.menus.find_studio(message.text)
+    if studio:
+        await state.update_data(studio=studio)
+        await state.set_state(PhotoPrintStates.size)
+        await message.answer("📏 Выберите размер:", reply_markup=app.menus.photo_size)
+        return
+    await message.answer("❌ Выберите студию:", reply_markup=app.menus.studio)
 
-@router.message(PhotoPrintStates.size)
-async def print_size(message: Message, state: FSMContext):
+@handlers.message(PhotoPrintStates.size)
+async def print_size(message: Message, state: FSMContext, app: "BotApp"):
     if message.text == "❌ Отмена": return
-    if message.text not in PHOTO_SIZES:
-        await message.answer("❌ Выберите размер:", reply_markup=photo_size_menu())
+    if message.text not in app.menus.photo_sizes:
+        await message.answer("❌ Выберите размер:", reply_markup=app.menus.photo_size)
         return
     await state.update_data(size=message.text)
     await state.set_state(PhotoPrintStates.quantity)
     await message.answer("🔢 Сколько фото напечатать? (введите число)")
 
-@router.message(PhotoPrintStates.quantity)
-async def print_quantity(message: Message, state: FSMContext):
+@handlers.message(PhotoPrintStates.quantity)
+async def print_quantity(message: Message, state: FSMContext, app: "BotApp"):
     if message.text == "❌ Отмена": return
     if not message.text.isdigit() or int(message.text) <= 0:
         await message.answer("❌ Введите корректное число (например: 5):")
         return
     await state.update_data(quantity=int(message.text))
     await state.set_state(PhotoPrintStates.paper_type)
-    await message.answer("📄 Выберите тип бумаги:", reply_markup=paper_type_menu())
+    await message.answer("📄 Выберите тип бумаги:", reply_markup=app.menus.paper_type)
 
-@router.message(PhotoPrintStates.paper_type)
-async def print_paper_type(message: Message, state: FSMContext):
+@handlers.message(PhotoPrintStates.paper_type)
+async def print_paper_type(message: Message, state: FSMContext, app: "BotApp"):
     if message.text == "❌ Отмена": return
-    if message.text not in ["Глянцевая", "Матовая"]:
-        await message.answer("❌ Выберите тип бумаги:", reply_markup=paper_type_menu())
+    if message.text not in app.menus.paper_types:
+        await message.answer("❌ Выберите тип бумаги:", reply_markup=app.menus.paper_type)
         return
     
     data = await state.get_data()
@@ -275,85 +393,98 @@ async def print_paper_type(message: Message, state: FSMContext):
     size = data['size']
     qty = data['quantity']
     paper = message.text
-    base = PHOTO_SIZES[size]
-    total = (base + (MATTE_SURCHARGE if paper == "Матовая" else 0)) * qty
+    try:
+        total = app.prices.quote("photo_print", size, qty, studio=STUDIO_KEYS.get(studio), options=(paper,)).total
+    except UnknownItem:
+        await item_unavailable(app, message, state, "photo_print")
+        return
     
     details = f"Студия: {studio}\nРазмер: {size}\nКол-во: {qty}\nБумага: {paper}\nСумма: {total} ₽"
-    order_id = save_order(message.from_user.id, message.from_user.username, "photo_print", details)
+    order_id = await app.repo.save_order(message.from_user.id, message.from_user.username, "photo_print", details,
+                                         studio=studio, item=size, quantity=qty, paper=paper, price=total)
     await state.update_data(order_id=order_id)
     
-    await message.answer(
-        f"✅ Заказ сформирован!\n"
-        f"📍 {studio} | {size} | {qty} шт.\n"
-        f"📄 {paper}\n"
-        f"💰 Итого: {total} ₽\n\n"
-        "1️⃣ Оплатите через СБП.\n"
-        "2️⃣ Отправьте фото для печати (можно по одному)."
-    )
-    await bot.send_message(ADMIN_ID, f"🖨️ Фотопечать\nЗаказ ID {order_id}\n{details}")
     await state.set_state(PhotoPrintStates.waiting_for_photos)
+    await send_together(
+        message.answer(
+            f"✅ Заказ сформирован!\n"
+            f"📍 {studio} | {size} | {qty} шт.\n"
+            f"📄 {paper}\n"
+            f"💰 Итого: {total} ₽\n\n"
+            "1️⃣ Оплатите через СБП.\n"
+            "2️⃣ Отправьте фото для печати (можно по одному)."
+        ),
+        app.notify_admins(f"🖨️ Фотопечать\nЗаказ ID {order_id}\n{details}", studio),
+    )
 
-@router.message(PhotoPrintStates.waiting_for_photos, F.photo)
-async def receive_photo(message: Message, state: FSMContext):
+@handlers.message(PhotoPrintStates.waiting_for_photos, F.photo)
+async def receive_photo(message: Message, state: FSMContext, app: "BotApp"):
     if message.text == "❌ Отмена": return
     data = await state.get_data()
     order_id = data.get('order_id')
     if not order_id:
-        await message.answer("❌ Ошибка. Начните заказ заново.", reply_markup=main_menu())
+        await message.answer("❌ Ошибка. Начните заказ заново.", reply_markup=app.menus.main)
         await state.clear()
         return
 
-    conn = sqlite3.connect('bot.db')
-    c = conn.cursor()
-    c.execute("INSERT INTO photos (order_id, file_id) VALUES (?, ?)", (order_id, message.photo[-1].file_id))
-    c.execute("SELECT COUNT(*) FROM photos WHERE order_id = ?", (order_id,))
-    received = c.fetchone()[0]
-    conn.commit()
-    conn.close()
+    photo = message.photo[-1]
+    received = await app.photo_buffer.add(order_id, photo.file_id)
+    app.media.prefetch(photo.file_id, photo.file_unique_id)
+    if message.media_group_id:
+        # На альбом — один ответ, после того как пришло последнее фото
+        if not await app.photo_buffer.settle_album(message.media_group_id):
+            return
+        received = app.photo_buffer.received(order_id)
+        if not received:
+            return
 
     expected = data['quantity']
     if received < expected:
         await message.answer(f"🖼️ Получено {received}/{expected}. Отправьте ещё {expected - received}.")
     else:
-        await message.answer("✅ Все фото получены! Заказ в работе.")
-        await bot.send_message(ADMIN_ID, f"🖼️ Заказ ID {order_id} готов к печати от @{message.from_user.username}")
+        if not await app.photo_buffer.finish(order_id):
+            return
         await state.clear()
-        await message.answer("✅ Ваш заказ принят в работу!", reply_markup=main_menu())
+        await send_together(
+            message.answer("✅ Все фото получены! Ваш заказ принят в работу!", reply_markup=app.menus.main),
+            app.notify_admins(f"🖼️ Заказ ID {order_id} готов к печати от @{message.from_user.username}\n"
+                              f"📦 Архив фото: /files {order_id}", data.get('studio')),
+        )
 
-@router.message(PhotoPrintStates.waiting_for_photos)
+@handlers.message(PhotoPrintStates.waiting_for_photos)
 async def not_photo_in_print(message: Message):
     if message.text == "❌ Отмена": return
     await message.answer("❌ Пожалуйста, отправьте фото (изображение).")
 
 # === РАСПЕЧАТКА ДОКУМЕНТОВ ===
-@router.message(F.text == "📄 Распечатка документов")
-async def start_doc_print(message: Message, state: FSMContext):
+@handlers.message(F.text == "📄 Распечатка документов")
+async def start_doc_print(message: Message, state: FSMContext, app: "BotApp"):
     await state.set_state(DocumentPrintStates.studio)
-    await message.answer("📍 Выберите студию:", reply_markup=studio_menu())
+    await message.answer("📍 Выберите студию:", reply_markup=app.menus.studio)
 
-@router.message(DocumentPrintStates.studio)
-async def doc_studio(message: Message, state: FSMContext):
+@handlers.message(DocumentPrintStates.studio)
+async def doc_studio(message: Message, state: FSMContext, app: "BotApp"):
     if message.text == "❌ Отмена": return
-    for key, addr in STUDIOS.items():
-        if message.text.startswith(f"{key}."):
-            await state.update_data(studio=addr)
-            await state.set_state(DocumentPrintStates.print_type)
-            await message.answer("🖨️ Выберите тип печати:", reply_markup=print_type_menu())
-            return
-    await message.answer("❌ Выберите студию:", reply_markup=studio_menu())
+    studio = app.menus.find_studio(message.text)
+    if studio:
+        await state.update_data(studio=studio)
+        await state.set_state(DocumentPrintStates.print_type)
+        await message.answer("🖨️ Выберите тип печати:", reply_markup=app.menus.print_type)
+        return
+    await message.answer("❌ Выберите студию:", reply_markup=app.menus.studio)
 
-@router.message(DocumentPrintStates.print_type)
-async def doc_type(message: Message, state: FSMContext):
+@handlers.message(DocumentPrintStates.print_type)
+async def doc_type(message: Message, state: FSMContext, app: "BotApp"):
     if message.text == "❌ Отмена": return
-    if message.text not in PRINT_PRICES:
-        await message.answer("❌ Выберите тип печати:", reply_markup=print_type_menu())
+    if message.text not in app.menus.print_types:
+        await message.answer("❌ Выберите тип печати:", reply_markup=app.menus.print_type)
         return
     await state.update_data(print_type=message.text)
     await state.set_state(DocumentPrintStates.quantity)
     await message.answer("📄 Сколько листов распечатать? (введите число)")
 
-@router.message(DocumentPrintStates.quantity)
-async def doc_quantity(message: Message, state: FSMContext):
+@handlers.message(DocumentPrintStates.quantity)
+async def doc_quantity(message: Message, state: FSMContext, app: "BotApp"):
     if message.text == "❌ Отмена": return
     if not message.text.isdigit() or int(message.text) <= 0:
         await message.answer("❌ Введите корректное число листов:")
@@ -362,37 +493,43 @@ async def doc_quantity(message: Message, state: FSMContext):
     data = await state.get_data()
     studio = data['studio']
     ptype = data['print_type']
-    total = PRINT_PRICES[ptype] * qty
+    try:
+        total = app.prices.quote("document_print", ptype, qty, studio=STUDIO_KEYS.get(studio)).total
+    except UnknownItem:
+        await item_unavailable(app, message, state, "document_print")
+        return
     details = f"Студия: {studio}\nТип: {ptype}\nЛистов: {qty}\nСумма: {total} ₽"
     
-    save_order(message.from_user.id, message.from_user.username, "document_print", details)
-    await message.answer(f"✅ Итого: {total} ₽.\nОплатите через СБП и пришлите файлы для печати.")
-    await bot.send_message(ADMIN_ID, f"📄 Распечатка документов\n{details}")
+    await app.repo.save_order(message.from_user.id, message.from_user.username, "document_print", details,
+                              studio=studio, item=ptype, quantity=qty, price=total)
     await state.clear()
-    await message.answer("✅ Ваш заказ принят в работу!", reply_markup=main_menu())
+    await send_together(
+        message.answer(f"✅ Итого: {total} ₽.\nОплатите через СБП и пришлите файлы для печати.\n\n"
+                       "✅ Ваш заказ принят в работу!", reply_markup=app.menus.main),
+        app.notify_admins(f"📄 Распечатка документов\n{details}", studio),
+    )
 
 # === 🧵 СУВЕНИРЫ С ВЫБОРОМ ТИПА ===
-@router.message(F.text == "👕 Сувениры")
-async def start_souvenirs(message: Message, state: FSMContext):
+@handlers.message(F.text == "👕 Сувениры")
+async def start_souvenirs(message: Message, state: FSMContext, app: "BotApp"):
     await state.set_state(SouvenirStates.type)
     await message.answer(
         "🎁 Выберите тип сувенира:",
-        reply_markup=souvenir_type_menu()
+        reply_markup=app.menus.souvenir_type
     )
 
-@router.message(SouvenirStates.type)
-async def souvenir_type(message: Message, state: FSMContext):
+@handlers.message(SouvenirStates.type)
+async def souvenir_type(message: Message, state: FSMContext, app: "BotApp"):
     if message.text == "❌ Отмена": return
-    valid_types = ["👕 Футболка", "☕ Кружка", "🖼️ Фото на керамике", "✏️ Другое"]
-    if message.text not in valid_types:
-        await message.answer("❌ Выберите тип сувенира из списка:", reply_markup=souvenir_type_menu())
+    if message.text not in app.menus.souvenir_types:
+        await message.answer("❌ Выберите тип сувенира из списка:", reply_markup=app.menus.souvenir_type)
         return
     await state.update_data(souvenir_type=message.text)
     await state.set_state(SouvenirStates.quantity)
-    await message.answer("🔢 Укажите количество:", reply_markup=make_keyboard([], with_cancel=True))
+    await message.answer("🔢 Укажите количество:", reply_markup=app.menus.cancel_only)
 
-@router.message(SouvenirStates.quantity)
-async def souvenir_quantity(message: Message, state: FSMContext):
+@handlers.message(SouvenirStates.quantity)
+async def souvenir_quantity(message: Message, state: FSMContext, app: "BotApp"):
     if message.text == "❌ Отмена": return
     if not message.text.isdigit() or int(message.text) <= 0:
         await message.answer("❌ Введите корректное число (например: 2):")
@@ -401,70 +538,381 @@ async def souvenir_quantity(message: Message, state: FSMContext):
     await state.set_state(SouvenirStates.description)
     await message.answer(
         "✏️ Опишите пожелания (размер, цвет, надпись и т.д.):",
-        reply_markup=make_keyboard([], with_cancel=True)
+        reply_markup=app.menus.cancel_only
     )
 
-@router.message(SouvenirStates.description)
-async def souvenir_description(message: Message, state: FSMContext):
+@handlers.message(SouvenirStates.description)
+async def souvenir_description(message: Message, state: FSMContext, app: "BotApp"):
     if message.text == "❌ Отмена": return
     await state.update_data(description=message.text)
     await state.set_state(SouvenirStates.waiting_for_file)
     await message.answer(
         "📎 Пришлите макет (изображение или PDF). Если макета нет — напишите «Без макета».",
-        reply_markup=make_keyboard([], with_cancel=True)
+        reply_markup=app.menus.cancel_only
     )
 
-@router.message(SouvenirStates.waiting_for_file, F.photo | F.document)
-async def souvenir_file_received(message: Message, state: FSMContext):
+@handlers.message(SouvenirStates.waiting_for_file, F.photo | F.document)
+async def souvenir_file_received(message: Message, state: FSMContext, app: "BotApp"):
     if message.text == "❌ Отмена": return
     data = await state.get_data()
     s_type = data['souvenir_type']
     qty = data['quantity']
     desc = data['description']
     
+    attachment = None
+    layout = None
     if message.photo:
         file_info = "Фото прикреплено"
+        attachment = "photo"
+        layout = message.photo[-1]
     elif message.document:
         file_info = f"Файл: {message.document.file_name}"
+        attachment = message.document.file_name
+        layout = message.document
     else:
         file_info = "Неизвестный файл"
 
-    details = f"Тип: {s_type}\nКол-во: {qty}\nПожелания: {desc}\n{file_info}"
-    order_id = save_order(message.from_user.id, message.from_user.username, "souvenirs", details)
-    
-    await bot.send_message(ADMIN_ID, f"👕 Сувениры\nЗаказ ID {order_id}\nКлиент: @{message.from_user.username}\n{details}")
+    try:
+        quote = app.prices.quote("souvenirs", s_type, qty)
+    except UnknownItem:
+        await item_unavailable(app, message, state, "souvenirs")
+        return
+    details = f"Тип: {s_type}\nКол-во: {qty}\nПожелания: {desc}\n{file_info}\nСумма: {format_price(quote)}"
+    order_id = await app.repo.save_order(message.from_user.id, message.from_user.username, "souvenirs", details,
+                                         item=s_type, quantity=qty, description=desc, attachment=attachment,
+                                         attachment_file_id=layout.file_id if layout else None,
+                                         price=quote.total if quote else None)
+    if layout:
+        app.media.prefetch(layout.file_id, layout.file_unique_id, attachment)
     
     await state.clear()
-    await message.answer("✅ Ваш заказ на сувенирную продукцию принят в работу!", reply_markup=main_menu())
+    await send_together(
+        message.answer("✅ Ваш заказ на сувенирную продукцию принят в работу!", reply_markup=app.menus.main),
+        app.notify_admins(f"👕 Сувениры\nЗаказ ID {order_id}\nКлиент: @{message.from_user.username}\n{details}\n"
+                          f"📦 Макет: /files {order_id}"),
+    )
 
-@router.message(SouvenirStates.waiting_for_file, F.text)
-async def souvenir_no_file(message: Message, state: FSMContext):
+@handlers.message(SouvenirStates.waiting_for_file, F.text)
+async def souvenir_no_file(message: Message, state: FSMContext, app: "BotApp"):
     if message.text == "❌ Отмена": return
     if "без макета" in message.text.lower():
         data = await state.get_data()
         s_type = data['souvenir_type']
         qty = data['quantity']
         desc = data['description']
-        details = f"Тип: {s_type}\nКол-во: {qty}\nПожелания: {desc}\nБез макета"
-        order_id = save_order(message.from_user.id, message.from_user.username, "souvenirs", details)
-        await bot.send_message(ADMIN_ID, f"👕 Сувениры\nЗаказ ID {order_id}\nКлиент: @{message.from_user.username}\n{details}")
+        try:
+            quote = app.prices.quote("souvenirs", s_type, qty)
+        except UnknownItem:
+            await item_unavailable(app, message, state, "souvenirs")
+            return
+        details = f"Тип: {s_type}\nКол-во: {qty}\nПожелания: {desc}\nБез макета\nСумма: {format_price(quote)}"
+        order_id = await app.repo.save_order(message.from_user.id, message.from_user.username, "souvenirs", details,
+                                             item=s_type, quantity=qty, description=desc,
+                                             price=quote.total if quote else None)
         await state.clear()
-        await message.answer("✅ Заказ принят! Мы свяжемся для уточнения деталей.", reply_markup=main_menu())
+        await send_together(
+            message.answer("✅ Заказ принят! Мы свяжемся для уточнения деталей.", reply_markup=app.menus.main),
+            app.notify_admins(f"👕 Сувениры\nЗаказ ID {order_id}\nКлиент: @{message.from_user.username}\n{details}"),
+        )
     else:
-        await message.answer("Пожалуйста, пришлите файл или напишите «Без макета».", reply_markup=make_keyboard([], with_cancel=True))
+        await message.answer("Пожалуйста, пришлите файл или напишите «Без макета».", reply_markup=app.menus.cancel_only)
+
+# === ПРИЛОЖЕНИЕ ===
+class BotApp:
+    # Собирает все компоненты бота по настройкам. Конструктор не делает
+    # ввода-вывода, кроме чтения prices.json; БД, кэш файлов, метрики и
+    # фоновые задачи запускаются в start().
+    def __init__(self, settings, session=None):
+        self.settings = settings
+        self.admin_ids = settings.admin_ids
+        if session is None:
+            # aiohttp-сессия и пул соединений создаются при первом запросе
+            session = BotApiSession(settings.bot_api_url, pool_size=settings.http_pool_size)
+        self.bot = Bot(token=settings.bot_token, session=session)
+        # Первой: время и ошибки Bot API в метриках — по каждой попытке
+        self.flood_control = FloodControlMiddleware()
+        self.bot.session.middleware(self.flood_control)
+
+        self.repo = OrderRepository(settings.db_path, settings.timezone)
+        self.reports = Reports(self.repo, settings.timezone)
+        self.bookings = Bookings(self.repo, settings.timezone, slot_minutes=settings.booking_slot_minutes,
+                                 hours=settings.booking_hours)
+        self.photo_buffer = PhotoBuffer(self.repo)
+        self.notifier = AdminNotifier(self.bot, self.repo)
+        self.media = MediaPipeline(self.bot, self.repo, MediaCache(settings.media_dir, settings.media_cache_mb * 2 ** 20),
+                                   concurrency=settings.media_downloads)
+        self.storage = SQLiteStorage(self.repo, on_expire=self.cleanup_abandoned_order)
+        # Заказ не старше TTL диалога: клиент ещё может дослать в него фото
+        self.maintenance = Maintenance(self.repo, self.notifier, settings.timezone,
+                                       stale_after=max(settings.stale_order_hours * 3600, self.storage.ttl),
+                                       on_purge=self.photo_buffer.discard)
+
+        # Цены, надбавки и скидки — в prices.json (перечитывается без перезапуска)
+        self.prices = PriceTable(settings.prices_path)
+        self._menus = None
+        self._menus_version = None
+
+        self.dp = Dispatcher(storage=self.storage, app=self)
+        self.dp.include_router(handlers.build_router())
+
+        # Защита от флуда
+        self.throttling = ThrottlingMiddleware(
+            user_limit=settings.throttle_user_limit, global_limit=settings.throttle_global_limit, state_limits={
+                # альбом из 10 фото приходит десятью сообщениями сразу
+                PhotoPrintStates.waiting_for_photos.state: (60, 10.0),
+            })
+        self.dp.message.outer_middleware(self.throttling)
+        self.dp.callback_query.outer_middleware(self.throttling)
+
+        self.metrics = Metrics()
+        self.metrics_runner = None
+        self.metrics_logger = None
+        self.startup_seconds = {}
+        self._user_locks = {}
+        self._register_metrics()
+
+    def _register_metrics(self):
+        metrics = self.metrics
+        handler_timing = HandlerTimingMiddleware(metrics, profile_rate=self.settings.profile_rate,
+                                                 profile_threshold=self.settings.profile_slow_seconds)
+        self.dp.message.middleware(handler_timing)
+        self.dp.callback_query.middleware(handler_timing)
+        self.bot.session.middleware(BotApiTimingMiddleware(metrics))
+        self.repo.observer = observe_sqlite(metrics)
+
+        metrics.gauge("bot_active_conversations", self.active_conversations, "Диалоги FSM в процессе, по группам состояний")
+        metrics.gauge("bot_notification_queue_depth", lambda: self.notifier.queue.qsize(), "Уведомления админам в очереди")
+        metrics.gauge("bot_photo_buffer_pending", self.photo_buffer.pending, "Фото, ещё не записанные в БД")
+        metrics.gauge("bot_throttled_updates_total",
+                      lambda: {(("kind", k),): v for k, v in self.throttling.stats.items()},
+                      "Обновления, прошедшие и отброшенные защитой от флуда", kind="counter")
+        metrics.gauge("bot_maintenance_total",
+                      lambda: {(("kind", k),): v for k, v in self.maintenance.stats.items()},
+                      "Результаты фоновых задач обслуживания", kind="counter")
+        metrics.gauge("bot_media_total",
+                      lambda: {(("kind", k),): v for k, v in {**self.media.stats, **self.media.cache.stats}.items()},
+                      "Загрузки фото и макетов и работа их кэша", kind="counter")
+        metrics.gauge("bot_bookings_total",
+                      lambda: {(("kind", k),): v for k, v in self.bookings.stats.items()},
+                      "Записи на фото на документы: оформлено, отклонено, гонки с другими процессами", kind="counter")
+        metrics.gauge("bot_flood_control_total",
+                      lambda: {(("kind", k),): v for k, v in self.flood_control.stats.items()},
+                      "Повторы запросов к Bot API после 429 и время ожидания", kind="counter")
+        metrics.gauge("bot_media_cache_bytes", lambda: self.media.cache.size, "Размер кэша файлов заказов")
+        metrics.gauge("bot_startup_seconds",
+                      lambda: {(("step", k),): v for k, v in self.startup_seconds.items()},
+                      "Время запуска: всего и по шагам")
+
+    @property
+    def menus(self):
+        # Кнопки позиций берутся из прайса: после перечитывания prices.json
+        # клавиатуры собираются заново
+        self.prices.maybe_reload()
+        if self._menus_version != self.prices.version:
+            self._menus = MenuRegistry(
+                main_buttons=MAIN_MENU_BUTTONS,
+                studios=STUDIOS,
+                studio_labels=STUDIO_LABELS,
+                id_photo_sizes=self.prices.items("photo_id"),
+                photo_sizes=self.prices.items("photo_print"),
+                paper_types=PAPER_TYPES,
+                print_types=self.prices.items("document_print"),
+                souvenir_types=self.prices.items("souvenirs"),
+            )
+            self._menus_version = self.prices.version
+        return self._menus
+
+    async def active_conversations(self):
+        groups = {}
+        for state, count in (await self.storage.count_states()).items():
+            group = state.split(":", 1)[0]
+            groups[(("group", group),)] = groups.get((("group", group),), 0) + count
+        return groups
+
+    async def cleanup_abandoned_order(self, state, data):
+        # Диалог истёк по TTL: заказ с фото, которые так и не пришли, удаляем
+        order_id = data.get('order_id')
+        if order_id:
+            self.photo_buffer.discard(order_id)
+            await self.repo.delete_order(order_id)
+
+    @asynccontextmanager
+    async def user_lock(self, user_id):
+        # Обработчики одного пользователя, которые не должны идти
+        # одновременно (двойное нажатие кнопки); запись удаляется, когда
+        # блокировку больше никто не ждёт
+        entry = self._user_locks.setdefault(user_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._user_locks[user_id]
+
+    # --- администраторы ---
+    def admin_recipients(self, studio=None):
+        return [self.settings.admin_id, *self.settings.studio_admins.get(STUDIO_KEYS.get(studio), [])]
+
+    async def notify_admins(self, text, studio=None):
+        await self.notifier.notify(text, self.admin_recipients(studio))
+
+    def admin_studios(self, user_id):
+        # Главному админу — все студии (None), админу студии — только его
+        if user_id == self.settings.admin_id:
+            return None
+        return {STUDIOS[key] for key, ids in self.settings.studio_admins.items() if user_id in ids and key in STUDIOS}
+
+    async def ping_admin(self):
+        try:
+            await self.bot.send_message(self.settings.admin_id, "✅ Бот A1 запущен и готов принимать заказы!",
+                                        request_timeout=10)
+        except Exception as e:
+            print(f"Не удалось уведомить админа: {e}")
+
+    # --- запуск и остановка ---
+    async def _timed(self, step, coro):
+        started = time.perf_counter()
+        result = await coro
+        self.startup_seconds[step] = time.perf_counter() - started
+        return result
+
+    async def _start_db(self, worker):
+        # Миграции, затем всё, что читает БД: индекс записей, истёкшие
+        # диалоги, очередь уведомлений (запросы идут подряд в потоке-писателе)
+        await self._timed("migrations", self.repo.init_db())
+        await self._timed("db_warmup", asyncio.gather(self.bookings.load(), self.storage.expire()))
+        self.storage.start()
+        if worker is None:
+            await self.notifier.start()
+        else:
+            await self.notifier.start(drain=worker == 0, poll_interval=1.0)
+        self.maintenance.start()
+
+    async def _start_metrics(self, worker):
+        settings = self.settings
+        if settings.metrics_port:
+            port = settings.metrics_port if worker is None else settings.metrics_port + 1 + worker
+            self.metrics_runner = await self.metrics.start_server(settings.metrics_host, port)
+        if settings.metrics_log_interval:
+            self.metrics_logger = asyncio.create_task(self.metrics.log_forever(settings.metrics_log_interval))
+
+    async def start(self, worker=None):
+        # worker — номер процесса-обработчика в режиме --workers N (см. sharding.py):
+        # уведомления админам отправляет только нулевой, метрики — каждый на своём порту.
+        # Независимые шаги идут параллельно; дольше startup_timeout — ошибка запуска.
+        started = time.perf_counter()
+        steps = [
+            self._timed("db", self._start_db(worker)),
+            self._timed("media_cache", self.media.start()),
+            self._timed("metrics", self._start_metrics(worker)),
+        ]
+        if worker is None:
+            steps.append(self._timed("admin_ping", self.ping_admin()))
+        try:
+            await asyncio.wait_for(asyncio.gather(*steps), self.settings.startup_timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"Запуск не уложился в {self.settings.startup_timeout:g} с: "
+                               f"готово {', '.join(self.startup_seconds) or 'ничего'}") from None
+        self.startup_seconds["total"] = time.perf_counter() - started
+        print(f"Запуск за {self.startup_seconds['total']:.2f} с (" +
+              ", ".join(f"{k} {v:.2f}" for k, v in self.startup_seconds.items() if k != "total") + ")")
+
+    async def close(self):
+        if self.metrics_logger:
+            self.metrics_logger.cancel()
+        if self.metrics_runner:
+            await self.metrics_runner.cleanup()
+        self.maintenance.close()
+        await self.notifier.close()
+        await self.storage.close()
+        await self.photo_buffer.close()
+        await self.media.close()
+        await self.repo.close()
+
+
+def create_app(settings=None, session=None):
+    # settings=None — из окружения и .env; session — своя сессия Bot API (бенчмарки, тесты)
+    return BotApp(settings or load_settings(), session)
+
 
 # === ЗАПУСК БОТА ===
-async def main():
-    init_db()
-    dp.include_router(router)
-    
+async def run_polling(app):
+    await app.dp.start_polling(app.bot)
+
+
+async def run_webhook(app):
+    settings = app.settings
+    if not settings.webhook_url or not settings.webhook_secret:
+        raise RuntimeError("Для режима webhook задайте WEBHOOK_URL и WEBHOOK_SECRET")
+
+    async def on_startup(bot: Bot):
+        await bot.set_webhook(
+            settings.webhook_url.rstrip("/") + settings.webhook_path,
+            secret_token=settings.webhook_secret,
+            allowed_updates=app.dp.resolve_used_update_types(),
+        )
+    # Вебхук при остановке не снимается: за балансировщиком могут работать
+    # другие экземпляры бота, и им обновления нужны дальше.
+    app.dp.startup.register(on_startup)
+
+    web_app = web.Application()
+    SimpleRequestHandler(dispatcher=app.dp, bot=app.bot, secret_token=settings.webhook_secret).register(
+        web_app, path=settings.webhook_path)
+    setup_application(web_app, app.dp, bot=app.bot)
+
+    runner = web.AppRunner(web_app)
+    await runner.setup()
+    site = web.TCPSite(runner, settings.webhook_host, settings.webhook_port)
+    await site.start()
+    print(f"Webhook слушает {settings.webhook_host}:{settings.webhook_port}{settings.webhook_path}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
     try:
-        await bot.send_message(ADMIN_ID, "✅ Бот A1 запущен и готов принимать заказы!")
-    except Exception as e:
-        print(f"Не удалось уведомить админа: {e}")
-    
-    await dp.start_polling(bot)
+        await stop.wait()
+    finally:
+        # Дожидаемся уже принятых запросов и вызываем shutdown диспетчера
+        await runner.cleanup()
+
+
+async def main(settings, mode=None):
+    mode = mode or settings.mode
+    if mode not in ("polling", "webhook"):
+        raise RuntimeError(f"Неизвестный режим запуска: {mode}")
+    app = create_app(settings)
+    try:
+        await app.start()
+        if mode == "webhook":
+            await run_webhook(app)
+        else:
+            await run_polling(app)
+    finally:
+        await app.close()
 
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Telegram-бот студии A1")
+    parser.add_argument("--mode", choices=MODES,
+                        help="способ получения обновлений (по умолчанию BOT_MODE или polling)")
+    parser.add_argument("--workers", type=int,
+                        help="число процессов-обработчиков (по умолчанию BOT_WORKERS или 1)")
+    args = parser.parse_args()
+    # Аргументы важнее BOT_MODE/BOT_WORKERS (.env их не перекрывает) и
+    # проверяются вместе с остальными настройками — например, WEBHOOK_SECRET для --mode webhook
+    if args.mode is not None:
+        os.environ["BOT_MODE"] = args.mode
+    if args.workers is not None:
+        os.environ["BOT_WORKERS"] = str(args.workers)
+    try:
+        settings = load_settings()
+    except SettingsError as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+    if settings.workers > 1:
+        import sharding
+        sharding.run(settings, settings.mode, settings.workers)
+    else:
+        asyncio.run(main(settings, settings.mode))
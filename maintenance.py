@@ -0,0 +1,194 @@
+import os
+import socket
+import sqlite3
+import time
+from datetime import datetime
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+
+STALE_ORDER_AGE = 48 * 60 * 60      # фотопечать без всех фото старше двух суток
+PURGE_BATCH = 500
+PURGE_INTERVAL = 30 * 60
+CHECKPOINT_INTERVAL = 10 * 60
+COMPACT_HOUR = 4                    # ночное сжатие БД, по времени студии
+VACUUM_PAGES = 2000                 # страниц за один проход incremental_vacuum
+ANALYSIS_LIMIT = 1000
+REMIND_BEFORE = 2 * 60 * 60
+REMIND_INTERVAL = 60
+REMIND_BATCH = 100
+REMINDER_TEXT = "⏰ Напоминаем о записи на фото на документы: {when}\n📍 {studio}\nЖдём вас!"
+
+
+# === ОБСЛУЖИВАНИЕ БД И НАПОМИНАНИЯ ===
+# Периодические задачи на AsyncIOScheduler в цикле событий бота. Весь SQL
+# идёт через поток-писатель OrderRepository, поэтому цикл не ждёт диск,
+# а тяжёлые удаления разбиты на короткие транзакции. Перед запуском задача
+# берёт аренду в maintenance_lease: если на одной БД работают несколько
+# экземпляров (или процессов --workers), в каждом окне её выполнит один.
+class Maintenance:
+    def __init__(self, repo, notifier, timezone, stale_after=STALE_ORDER_AGE, purge_batch=PURGE_BATCH,
+                 remind_before=REMIND_BEFORE, on_purge=None):
+        self.repo = repo
+        self.notifier = notifier
+        self.timezone = timezone
+        self.stale_after = stale_after
+        self.purge_batch = purge_batch
+        self.remind_before = remind_before
+        self.on_purge = on_purge
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.scheduler = AsyncIOScheduler(timezone=timezone, job_defaults={
+            "coalesce": True, "max_instances": 1, "misfire_grace_time": 5 * 60,
+        })
+        self.stats = {"purged_orders": 0, "purged_photos": 0, "reminders": 0,
+                      "checkpoints": 0, "vacuum_pages": 0, "skipped": 0, "errors": 0}
+        self._vacuum_warned = False
+
+    # --- SQL (поток-писатель) ---
+    def _acquire(self, name, ttl):
+        now = time.time()
+        with self.repo.transaction() as c:
+            c.execute('''INSERT INTO maintenance_lease (name, owner, expires_at) VALUES (?, ?, ?)
+                         ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                         WHERE maintenance_lease.expires_at <= ? OR maintenance_lease.owner = excluded.owner''',
+                      (name, self.owner, now + ttl, now))
+            return c.rowcount == 1
+
+    def _purge_batch(self, cutoff):
+        # Фотопечать, для которой так и не пришли все фото; фото уходят каскадом
+        with self.repo.transaction() as c:
+            ids = [row[0] for row in c.execute(
+                '''SELECT o.id FROM orders o
+                   WHERE o.service = 'photo_print' AND o.created_at < ?
+                     AND o.quantity > (SELECT COUNT(*) FROM photos p WHERE p.order_id = o.id)
+                   ORDER BY o.created_at LIMIT ?''', (cutoff, self.purge_batch))]
+            if not ids:
+                return ids, 0
+            marks = ", ".join("?" * len(ids))
+            photos = c.execute(f"SELECT COUNT(*) FROM photos WHERE order_id IN ({marks})", ids).fetchone()[0]
+            c.execute(f"DELETE FROM orders WHERE id IN ({marks})", ids)
+            return ids, photos
+
+    def _claim_reminders(self, now):
+        # Выбор и пометка в одной транзакции: одно напоминание — один раз.
+        # Кто записался меньше чем за remind_before до визита, не напоминаем
+        with self.repo.transaction() as c:
+            rows = c.execute(
+                '''SELECT id, user_id, studio, appointment_at FROM orders
+                   WHERE reminded_at IS NULL AND appointment_at > ? AND appointment_at <= ?
+                     AND created_at <= datetime(appointment_at - ?, 'unixepoch')
+                   ORDER BY appointment_at LIMIT ?''',
+                (now, now + self.remind_before, self.remind_before, REMIND_BATCH)).fetchall()
+            c.executemany("UPDATE orders SET reminded_at = ? WHERE id = ?", [(now, row[0]) for row in rows])
+            return rows
+
+    def _checkpoint(self):
+        return self.repo.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+
+    def _compact(self):
+        conn = self.repo.conn
+        free = 0
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            conn.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES})").fetchall()
+        elif not self._vacuum_warned:
+            # Полный VACUUM старой БД занял бы поток-писатель на минуты, а
+            # другие процессы получили бы «database is locked» — только вручную
+            self._vacuum_warned = True
+            print("БД создана без auto_vacuum=INCREMENTAL, ночное сжатие пропущено. "
+                  "Остановите бота и выполните: python maintenance.py vacuum")
+        conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        conn.execute("PRAGMA optimize")
+        return min(free, VACUUM_PAGES)
+
+    # --- задачи ---
+    async def _locked(self, name, ttl, job):
+        try:
+            if not await self.repo.run(self._acquire, name, ttl):
+                self.stats["skipped"] += 1
+                return
+            await job()
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Задача обслуживания {name} не выполнена: {e}")
+
+    async def purge_stale_orders(self):
+        cutoff = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(time.time() - self.stale_after))
+        purged = 0
+        while True:
+            ids, photos = await self.repo.run(self._purge_batch, cutoff)
+            if self.on_purge:
+                for order_id in ids:
+                    self.on_purge(order_id)
+            self.stats["purged_orders"] += len(ids)
+            self.stats["purged_photos"] += photos
+            purged += len(ids)
+            if len(ids) < self.purge_batch:
+                break
+        if purged:
+            print(f"Удалено незавершённых заказов фотопечати: {purged}")
+
+    async def send_reminders(self):
+        for _, user_id, studio, appointment_at in await self.repo.run(self._claim_reminders, time.time()):
+            when = datetime.fromtimestamp(appointment_at, self.timezone).strftime("%d.%m в %H:%M")
+            await self.notifier.notify(REMINDER_TEXT.format(when=when, studio=studio), [user_id])
+            self.stats["reminders"] += 1
+
+    async def checkpoint(self):
+        busy, _, _ = await self.repo.run(self._checkpoint)
+        if not busy:
+            self.stats["checkpoints"] += 1
+
+    async def compact(self):
+        self.stats["vacuum_pages"] += await self.repo.run(self._compact)
+
+    def start(self):
+        now = datetime.now(self.timezone)
+        jobs = (
+            # имя, задача, расписание, длительность аренды, первый запуск
+            ("purge_stale_orders", self.purge_stale_orders, IntervalTrigger(seconds=PURGE_INTERVAL), PURGE_INTERVAL, now),
+            ("send_reminders", self.send_reminders, IntervalTrigger(seconds=REMIND_INTERVAL), REMIND_INTERVAL, now),
+            ("checkpoint", self.checkpoint, IntervalTrigger(seconds=CHECKPOINT_INTERVAL), CHECKPOINT_INTERVAL, None),
+            ("compact", self.compact, CronTrigger(hour=COMPACT_HOUR, timezone=self.timezone), 60 * 60, None),
+        )
+        for name, job, trigger, interval, first_run in jobs:
+            # Аренда чуть короче интервала: следующий запуск её уже не застанет
+            options = {"next_run_time": first_run} if first_run else {}
+            self.scheduler.add_job(self._locked, trigger, args=(name, interval * 0.9, job), id=name, **options)
+        self.scheduler.start()
+
+    def close(self):
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+
+
+# === ПОЛНОЕ СЖАТИЕ (вручную) ===
+# Одноразовый перевод старой БД на auto_vacuum=INCREMENTAL: VACUUM
+# переписывает весь файл и держит блокировку записи, поэтому бот на это
+# время останавливают.
+def vacuum(path):
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        before = os.path.getsize(path)
+        started = time.perf_counter()
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        # В режиме WAL файл БД уменьшается только после checkpoint
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"{path}: {before / 2 ** 20:.1f} → {os.path.getsize(path) / 2 ** 20:.1f} МБ "
+              f"за {time.perf_counter() - started:.1f} с")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from db import DB_PATH
+
+    parser = argparse.ArgumentParser(description="Обслуживание БД бота A1")
+    parser.add_argument("command", choices=["vacuum"], help="vacuum — полный VACUUM, бот должен быть остановлен")
+    parser.add_argument("--db", default=os.getenv("DB_PATH", DB_PATH), help="путь к БД (по умолчанию DB_PATH)")
+    args = parser.parse_args()
+    vacuum(args.db)
@@ -0,0 +1,360 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from aiogram.types import InputFile
+
+MEDIA_DIR = "media"
+MEDIA_CACHE_BYTES = 2 * 1024 ** 3
+DOWNLOAD_CONCURRENCY = 4
+DOWNLOAD_TIMEOUT = 120
+UPLOAD_TIMEOUT = 300
+CHUNK_SIZE = 64 * 1024
+ZIP_PART_BYTES = 45 * 1024 * 1024   # Bot API принимает от бота документы до 50 МБ
+TMP_MAX_AGE = 24 * 3600   # недокачанное старше суток — брошено, даже если pid занят другим процессом
+
+
+class _BlobWriter:
+    # Приёмник для bot.download: пишет во временный файл и сразу считает sha256
+    def __init__(self, directory):
+        self.file = tempfile.NamedTemporaryFile(dir=directory, prefix="part-", delete=False)
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk):
+        self.hash.update(chunk)
+        self.file.write(chunk)
+        self.size += len(chunk)
+        return len(chunk)
+
+    def flush(self):
+        pass  # aiogram зовёт flush после каждого куска; сбросим на диск в конце
+
+
+# === КЭШ ФАЙЛОВ ===
+# Файлы лежат по sha256 содержимого (media/ab/abcdef…), поэтому одинаковые
+# загрузки хранятся один раз. При превышении max_bytes удаляются давно не
+# использованные. Индекс в памяти восстанавливается сканированием каталога.
+# Каталог могут делить несколько процессов (--workers): у каждого свой
+# tmp/<pid> и свой индекс, поэтому max_bytes — бюджет одного процесса.
+# Открытие, переименование, удаление и сканирование файлов — в отдельном
+# потоке; сами скачанные куски _BlobWriter пишет из цикла событий (запись
+# в page cache, без fsync).
+class MediaCache:
+    def __init__(self, root=MEDIA_DIR, max_bytes=MEDIA_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.tmp = os.path.join(root, "tmp", str(os.getpid()))
+        self._entries = OrderedDict()   # sha -> размер, от давно не нужных к свежим
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="media-cache")
+        self.stats = {"hits": 0, "stored": 0, "deduped": 0, "evicted": 0}
+
+    def path(self, sha):
+        return os.path.join(self.root, sha[:2], sha)
+
+    async def run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    # --- синхронные операции (поток кэша) ---
+    def _load(self):
+        self._clean_tmp()
+        os.makedirs(self.tmp, exist_ok=True)
+        found = []
+        for bucket in os.scandir(self.root):
+            if not bucket.is_dir() or len(bucket.name) != 2:
+                continue
+            for entry in os.scandir(bucket.path):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, sha, size in sorted(found):
+            self._entries[sha] = size
+            self.size += size
+        self._evict()
+
+    def _clean_tmp(self):
+        # Недокачанное остановившимися процессами; загрузки живых соседей не трогаем
+        root = os.path.join(self.root, "tmp")
+        os.makedirs(root, exist_ok=True)
+        expired = time.time() - TMP_MAX_AGE
+        for owner in os.scandir(root):
+            if not owner.is_dir():
+                os.unlink(owner.path)   # раскладка до tmp/<pid>
+                continue
+            abandoned = owner.path == self.tmp or not _process_alive(owner.name)
+            for entry in os.scandir(owner.path):
+                try:
+                    if abandoned or entry.stat().st_mtime < expired:
+                        os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+            if abandoned and owner.path != self.tmp:
+                try:
+                    os.rmdir(owner.path)
+                except OSError:
+                    pass
+
+    def _touch(self, sha):
+        if sha not in self._entries:
+            return None
+        self._entries.move_to_end(sha)
+        path = self.path(sha)
+        try:
+            os.utime(path)  # порядок LRU переживает перезапуск
+        except FileNotFoundError:
+            # удалён другим процессом на том же каталоге
+            self.size -= self._entries.pop(sha)
+            return None
+        self.stats["hits"] += 1
+        return path
+
+    def _open_writer(self):
+        return _BlobWriter(self.tmp)
+
+    def _commit(self, writer):
+        writer.file.close()
+        sha = writer.hash.hexdigest()
+        path = self.path(sha)
+        if sha in self._entries or os.path.exists(path):
+            os.unlink(writer.file.name)
+            self.stats["deduped"] += 1
+            if sha not in self._entries:
+                self._entries[sha] = writer.size
+                self.size += writer.size
+            self._entries.move_to_end(sha)
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(writer.file.name, path)
+            self._entries[sha] = writer.size
+            self.size += writer.size
+            self.stats["stored"] += 1
+        self._evict(keep=sha)
+        return sha, writer.size
+
+    def _abort(self, writer):
+        writer.file.close()
+        try:
+            os.unlink(writer.file.name)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, keep=None):
+        while self.size > self.max_bytes and self._entries:
+            sha, size = next(iter(self._entries.items()))
+            if sha == keep:
+                break
+            del self._entries[sha]
+            self.size -= size
+            try:
+                os.unlink(self.path(sha))
+            except FileNotFoundError:
+                pass
+            self.stats["evicted"] += 1
+
+    # --- асинхронный интерфейс ---
+    async def load(self):
+        await self.run(self._load)
+
+    async def touch(self, sha):
+        return await self.run(self._touch, sha)
+
+    async def open_writer(self):
+        return await self.run(self._open_writer)
+
+    async def commit(self, writer):
+        return await self.run(self._commit, writer)
+
+    async def abort(self, writer):
+        await self.run(self._abort, writer)
+
+    async def close(self):
+        self._executor.shutdown(wait=True)
+
+
+class _ZipSink:
+    # zipfile пишет сюда, а генератор забирает накопленное кусками
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        # Хвост предыдущего файла и заголовок следующего уходят с первым куском
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+class ZipInputFile(InputFile):
+    # Архив собирается на лету прямо в тело запроса sendDocument
+    def __init__(self, pipeline, entries, filename):
+        super().__init__(filename=filename, chunk_size=CHUNK_SIZE)
+        self.pipeline = pipeline
+        self.entries = entries
+
+    async def read(self, bot):
+        async for chunk in self.pipeline.stream_zip(self.entries):
+            yield chunk
+
+
+# === ЗАГРУЗКА ФАЙЛОВ ЗАКАЗОВ ===
+# Фото фотопечати и макеты сувениров скачиваются через bot.download сразу
+# после получения, не больше concurrency одновременно. Какой file_id какому
+# содержимому соответствует, хранится в таблице media; повторная загрузка
+# того же файла (тот же file_unique_id или тот же sha256) не занимает места.
+class MediaPipeline:
+    def __init__(self, bot, repo, cache, concurrency=DOWNLOAD_CONCURRENCY, timeout=DOWNLOAD_TIMEOUT):
+        self.bot = bot
+        self.repo = repo
+        self.cache = cache
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._inflight = {}
+        self._tasks = set()   # фоновые prefetch, дожидаемся при закрытии
+        self.stats = {"downloaded": 0, "bytes": 0, "reused": 0, "errors": 0}
+
+    # --- SQL (поток-писатель) ---
+    def _lookup(self, file_id, unique_id):
+        return self.repo.conn.execute(
+            '''SELECT sha256, size, name, file_id FROM media WHERE file_id = ?
+               UNION ALL
+               SELECT sha256, size, name, file_id FROM media WHERE file_unique_id = ? AND ? IS NOT NULL
+               LIMIT 1''', (file_id, unique_id, unique_id)).fetchone()
+
+    def _remember(self, file_id, unique_id, sha, size, name):
+        with self.repo.transaction() as c:
+            c.execute('''INSERT INTO media (file_id, file_unique_id, sha256, size, name, fetched_at)
+                         VALUES (?, ?, ?, ?, ?, ?)
+                         ON CONFLICT(file_id) DO UPDATE SET sha256 = excluded.sha256, size = excluded.size,
+                             fetched_at = excluded.fetched_at''',
+                      (file_id, unique_id, sha, size, name, time.time()))
+
+    def _order_files(self, order_id):
+        row = self.repo.conn.execute(
+            "SELECT service, attachment_file_id, attachment FROM orders WHERE id = ?", (order_id,)).fetchone()
+        if row is None:
+            return None
+        files = [(f"{order_id}_{n:03d}.jpg", file_id, None) for n, (file_id,) in enumerate(
+            self.repo.conn.execute("SELECT file_id FROM photos WHERE order_id = ? ORDER BY id", (order_id,)), 1)]
+        if row[1]:
+            name = row[2] if row[2] and row[2] != "photo" else "макет.jpg"
+            files.append((f"{order_id}_{name}", row[1], row[2]))
+        return files
+
+    # --- загрузка ---
+    def prefetch(self, file_id, unique_id=None, name=None):
+        # Для обработчиков: скачать в фоне, ошибки только в лог
+        task = asyncio.create_task(self.fetch(file_id, unique_id, name))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(_log_failure)
+        return task
+
+    async def fetch(self, file_id, unique_id=None, name=None):
+        # -> (путь в кэше, размер)
+        row = await self.repo.run(self._lookup, file_id, unique_id)
+        if row is not None:
+            path = await self.cache.touch(row[0])
+            if path is not None:
+                if row[3] != file_id:
+                    # Тот же файл прислали заново: запоминаем и новый file_id
+                    await self.repo.run(self._remember, file_id, unique_id, row[0], row[1], name or row[2])
+                self.stats["reused"] += 1
+                return path, row[1]
+        task = self._inflight.get(file_id)
+        if task is None:
+            task = self._inflight[file_id] = asyncio.create_task(self._download(file_id, unique_id, name))
+            task.add_done_callback(lambda _: self._inflight.pop(file_id, None))
+        return await asyncio.shield(task)
+
+    async def _download(self, file_id, unique_id, name):
+        async with self._semaphore:
+            writer = await self.cache.open_writer()
+            try:
+                await self.bot.download(file_id, destination=writer, timeout=self.timeout, seek=False)
+                sha, size = await self.cache.commit(writer)
+            except BaseException:
+                self.stats["errors"] += 1
+                await self.cache.abort(writer)
+                raise
+        await self.repo.run(self._remember, file_id, unique_id, sha, size, name)
+        self.stats["downloaded"] += 1
+        self.stats["bytes"] += size
+        return self.cache.path(sha), size
+
+    # --- архив заказа ---
+    async def zip_parts(self, order_id, part_bytes=ZIP_PART_BYTES):
+        # None — нет заказа, [] — нет файлов. Файлы докачиваются при
+        # необходимости и делятся на архивы, которые пропустит Bot API.
+        files = await self.repo.run(self._order_files, order_id)
+        if not files:
+            return files
+        fetched = await asyncio.gather(*(self.fetch(file_id, None, name) for _, file_id, name in files))
+        groups, group, total = [], [], 0
+        for (arcname, file_id, name), (_, size) in zip(files, fetched):
+            if group and total + size > part_bytes:
+                groups.append(group)
+                group, total = [], 0
+            group.append((arcname, file_id, name))
+            total += size
+        groups.append(group)
+        suffix = lambda n: f"_{n}" if len(groups) > 1 else ""
+        return [ZipInputFile(self, group, f"order_{order_id}{suffix(n)}.zip") for n, group in enumerate(groups, 1)]
+
+    async def stream_zip(self, entries):
+        # Без сжатия: JPEG и PDF почти не сжимаются. В памяти — не больше куска
+        loop = asyncio.get_running_loop()
+        sink = _ZipSink()
+        archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED)
+        for arcname, file_id, name in entries:
+            path, size = await self.fetch(file_id, None, name)
+            info = zipfile.ZipInfo(arcname, time.localtime()[:6])
+            info.file_size = size
+            with open(path, "rb") as src, archive.open(info, "w") as dst:
+                while chunk := await loop.run_in_executor(None, src.read, CHUNK_SIZE):
+                    dst.write(chunk)
+                    yield sink.drain()
+        archive.close()  # центральный каталог и дескриптор последнего файла
+        yield sink.drain()
+
+    async def start(self):
+        await self.cache.load()
+
+    async def close(self):
+        # Сначала prefetch: до скачивания они ещё ходят в repo и кэш
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._inflight:
+            await asyncio.gather(*self._inflight.values(), return_exceptions=True)
+        await self.cache.close()
+
+
+def _process_alive(pid):
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass   # процесс есть, но чужой
+    return True
+
+
+def _log_failure(task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Не удалось скачать файл: {task.exception()}")
@@ -0,0 +1,208 @@
+import asyncio
+import cProfile
+import os
+import random
+import time
+from bisect import bisect_left
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiohttp import web
+
+# Границы корзин гистограмм, секунды
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SUMMARY_INTERVAL = 5 * 60
+PROFILE_THRESHOLD = 1.0
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Оценка по корзинам: верхняя граница корзины, куда попал квантиль
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound if bound != float("inf") else BUCKETS[-1]
+        return BUCKETS[-1]
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+# === МЕТРИКИ ===
+# Гистограммы задержек, счётчики и датчики (gauge) в памяти процесса.
+# Отдаются в текстовом формате Prometheus и раз в несколько минут — сводкой в лог.
+class Metrics:
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.help = {}
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, collect, help_text="", kind="gauge"):
+        # collect() возвращает число или {кортеж меток: число}; может быть корутиной.
+        # kind="counter" — для счётчиков, которые ведёт сам компонент
+        self.gauges[name] = (collect, kind)
+        self.help[name] = help_text
+
+    async def _collect_gauges(self):
+        values = {}
+        for name, (collect, _) in self.gauges.items():
+            try:
+                value = collect()
+                if asyncio.iscoroutine(value):
+                    value = await value
+            except Exception as e:
+                print(f"Не удалось снять метрику {name}: {e}")
+                continue
+            values[name] = value if isinstance(value, dict) else {(): value}
+        return values
+
+    async def render(self):
+        lines = []
+        names = sorted({name for name, _ in self.histograms})
+        for name in names:
+            lines.append(f"# TYPE {name} histogram")
+            for (hname, labels), h in sorted(self.histograms.items()):
+                if hname != name:
+                    continue
+                cumulative = 0
+                for bound, n in zip(BUCKETS, h.counts):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {h.count}")
+                lines.append(f"{name}_sum{_labels(labels)} {h.sum:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {h.count}")
+        for name in sorted({name for name, _ in self.counters}):
+            lines.append(f"# TYPE {name} counter")
+            for (cname, labels), value in sorted(self.counters.items()):
+                if cname == name:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+        for name, series in sorted((await self._collect_gauges()).items()):
+            if self.help.get(name):
+                lines.append(f"# HELP {name} {self.help[name]}")
+            lines.append(f"# TYPE {name} {self.gauges[name][1]}")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, name="bot_handler_seconds"):
+        rows = []
+        for (hname, labels), h in sorted(self.histograms.items()):
+            if hname == name and h.count:
+                label = ",".join(str(v) for _, v in labels)
+                rows.append(f"{label}: n={h.count} p50≤{h.quantile(0.5) * 1000:.0f}мс "
+                            f"p99≤{h.quantile(0.99) * 1000:.0f}мс")
+        return rows
+
+    # --- HTTP и лог ---
+    async def start_server(self, host, port):
+        async def handle(request):
+            return web.Response(text=await self.render(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+    async def log_forever(self, interval=SUMMARY_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            rows = self.summary()
+            if rows:
+                print("Метрики обработчиков:\n  " + "\n  ".join(rows))
+
+
+# === MIDDLEWARE ===
+class HandlerTimingMiddleware(BaseMiddleware):
+    # Внутренний middleware роутера: в data уже есть выбранный обработчик.
+    # Медленные обновления можно профилировать выборочно через cProfile.
+    def __init__(self, metrics, profile_rate=0.0, profile_threshold=PROFILE_THRESHOLD, profile_dir="profiles"):
+        self.metrics = metrics
+        self.profile_rate = profile_rate
+        self.profile_threshold = profile_threshold
+        self.profile_dir = profile_dir
+        self._profiling = False
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object else "unknown"
+        profiler = None
+        if self.profile_rate and not self._profiling and random.random() < self.profile_rate:
+            # cProfile один на процесс: в профиль попадёт и всё, что цикл
+            # событий выполнял параллельно с этим обновлением
+            self._profiling = True
+            profiler = cProfile.Profile()
+            profiler.enable()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.metrics.inc("bot_handler_errors_total", handler=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.metrics.observe("bot_handler_seconds", elapsed, handler=name)
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+                if elapsed >= self.profile_threshold:
+                    os.makedirs(self.profile_dir, exist_ok=True)
+                    path = os.path.join(self.profile_dir, f"{name}-{int(time.time() * 1000)}.prof")
+                    profiler.dump_stats(path)
+                    self.metrics.inc("bot_profiles_saved_total", handler=name)
+
+
+class BotApiTimingMiddleware(BaseRequestMiddleware):
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    async def __call__(self, make_request, bot, method):
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            self.metrics.inc("bot_api_errors_total", method=method.__api_method__, error=type(e).__name__)
+            raise
+        finally:
+            self.metrics.observe("bot_api_seconds", time.perf_counter() - started, method=method.__api_method__)
+
+
+def observe_sqlite(metrics):
+    # Колбэк для OrderRepository.observer: время операции в потоке-писателе
+    # и полное ожидание со стороны цикла событий (включая очередь)
+    def observer(operation, executed, waited):
+        metrics.observe("bot_sqlite_seconds", executed, operation=operation)
+        metrics.observe("bot_sqlite_wait_seconds", waited, operation=operation)
+    return observer
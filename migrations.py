@@ -0,0 +1,308 @@
+import re
+import time
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from appointments import DEFAULT_TIMEZONE, parse_appointment
+
+# === МИГРАЦИИ СХЕМЫ ===
+# Версия схемы хранится в PRAGMA user_version. Каждая миграция выполняется
+# в своей транзакции вместе с повышением версии, поэтому прерванный запуск
+# просто повторится при следующем старте.
+MIGRATIONS = []
+
+
+def migration(version):
+    def register(fn):
+        MIGRATIONS.append((version, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(repo):
+    applied = []
+    for version, fn in MIGRATIONS:
+        if version <= current_version(repo.conn):
+            continue
+        with repo.transaction() as c:
+            fn(c)
+            c.execute(f"PRAGMA user_version = {int(version)}")
+        applied.append(version)
+    return applied
+
+
+@migration(1)
+def initial_schema(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS orders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        username TEXT,
+        service TEXT,
+        details TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS photos (
+        order_id INTEGER,
+        file_id TEXT
+    )''')
+
+
+# Структурированные поля заказа, которые принимает save_order. Новое поле
+# добавляется сюда и отдельной миграцией, уже применённые не меняются.
+ORDER_COLUMNS = {
+    "studio": "TEXT",
+    "item": "TEXT",
+    "paper": "TEXT",
+    "quantity": "INTEGER",
+    "price": "INTEGER",
+    "phone": "TEXT",
+    "appointment_time": "TEXT",
+    "description": "TEXT",
+    "attachment": "TEXT",
+    "appointment_at": "REAL",       # миграция 5: время записи на фото на документы, unix-время
+    "attachment_file_id": "TEXT",   # миграция 6: file_id макета сувенира
+    "slot_at": "INTEGER",           # миграция 8: занятый слот записи (booking.py), unix-время
+}
+
+DETAILS_FIELDS = {
+    "Студия": "studio",
+    "Размер": "item",
+    "Тип": "item",
+    "Кол-во": "quantity",
+    "Листов": "quantity",
+    "Бумага": "paper",
+    "Телефон": "phone",
+    "Время": "appointment_time",
+    "Сумма": "price",
+    "Пожелания": "description",
+    "Файл": "attachment",
+}
+
+_NUMBER = re.compile(r"\d+")
+
+
+def parse_details(details):
+    fields = {}
+    last = None
+    for line in (details or "").splitlines():
+        key, sep, value = line.partition(": ")
+        column = DETAILS_FIELDS.get(key) if sep else None
+        if column is None:
+            if line == "Фото прикреплено":
+                fields["attachment"] = "photo"
+            elif line == "Без макета":
+                fields["attachment"] = None
+            elif last == "description":
+                # многострочные пожелания клиента
+                fields["description"] += "\n" + line
+            continue
+        value = value.strip()
+        if column in ("quantity", "price"):
+            match = _NUMBER.search(value.replace(" ", ""))
+            value = int(match.group()) if match else None
+        fields[column] = value
+        last = column
+    return fields
+
+
+BACKFILL_CHUNK = 5000
+
+
+def add_column(c, table, column, sql_type):
+    # Базы, собранные до того, как у миграции 2 появился свой список
+    # столбцов, уже могут содержать столбцы поздних миграций
+    if column not in {row[1] for row in c.execute(f"PRAGMA table_info({table})")}:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}")
+
+
+@migration(2)
+def structured_orders(c):
+    # Структурированные поля заказа вместо разбора текста details
+    columns = {
+        "studio": "TEXT",
+        "item": "TEXT",
+        "paper": "TEXT",
+        "quantity": "INTEGER",
+        "price": "INTEGER",
+        "phone": "TEXT",
+        "appointment_time": "TEXT",
+        "description": "TEXT",
+        "attachment": "TEXT",
+    }
+    for column, sql_type in columns.items():
+        add_column(c, "orders", column, sql_type)
+
+    # Разбираем старые details пачками по возрастанию id
+    last_id = 0
+    while True:
+        rows = c.execute("SELECT id, details FROM orders WHERE id > ? ORDER BY id LIMIT ?",
+                         (last_id, BACKFILL_CHUNK)).fetchall()
+        if not rows:
+            break
+        updates = []
+        for order_id, details in rows:
+            fields = parse_details(details)
+            updates.append(tuple(fields.get(col) for col in columns) + (order_id,))
+        assignments = ", ".join(f"{col} = ?" for col in columns)
+        c.executemany(f"UPDATE orders SET {assignments} WHERE id = ?", updates)
+        last_id = rows[-1][0]
+
+    # photos пересоздаётся: внешний ключ в SQLite не добавить через ALTER.
+    # Фото без заказа (осиротевшие после старых сбоев) не переносятся.
+    c.execute('''CREATE TABLE photos_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id INTEGER NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+        file_id TEXT NOT NULL
+    )''')
+    c.execute('''INSERT INTO photos_new (order_id, file_id)
+                 SELECT order_id, file_id FROM photos
+                 WHERE order_id IN (SELECT id FROM orders) AND file_id IS NOT NULL''')
+    c.execute("DROP TABLE photos")
+    c.execute("ALTER TABLE photos_new RENAME TO photos")
+
+    c.execute("CREATE INDEX IF NOT EXISTS idx_photos_order ON photos(order_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_orders_user ON orders(user_id, created_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_orders_service_created ON orders(service, created_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(created_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_orders_studio_created ON orders(studio, created_at)")
+
+
+@migration(3)
+def fsm_state(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS fsm_state (
+        key TEXT PRIMARY KEY,
+        state TEXT,
+        data TEXT NOT NULL DEFAULT '{}',
+        updated_at REAL NOT NULL
+    )''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_fsm_state_updated ON fsm_state(updated_at)")
+
+
+@migration(4)
+def notification_outbox(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS notification_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        created_at REAL NOT NULL
+    )''')
+
+
+@migration(5)
+def maintenance(c):
+    add_column(c, "orders", "appointment_at", "REAL")
+    add_column(c, "orders", "reminded_at", "REAL")
+
+    # Время записи разбираем относительно даты оформления заказа. Прошедшие
+    # записи сразу помечаются напомненными, чтобы после миграции не слать их
+    tz = ZoneInfo(DEFAULT_TIMEZONE)
+    now = time.time()
+    rows = c.execute("""SELECT id, appointment_time, created_at FROM orders
+                        WHERE service = 'photo_id' AND appointment_time IS NOT NULL""").fetchall()
+    updates = []
+    for order_id, text, created_at in rows:
+        try:
+            created = datetime.fromisoformat(created_at).replace(tzinfo=timezone.utc).astimezone(tz)
+        except (TypeError, ValueError):
+            continue
+        appointment = parse_appointment(text, created)
+        if appointment is not None:
+            at = appointment.timestamp()
+            updates.append((at, now if at <= now else None, order_id))
+    c.executemany("UPDATE orders SET appointment_at = ?, reminded_at = ? WHERE id = ?", updates)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_orders_reminder ON orders(appointment_at) WHERE reminded_at IS NULL")
+
+    # Аренда фоновых задач: при нескольких экземплярах бота на одной БД
+    # каждую задачу в своё окно выполняет только один из них
+    c.execute('''CREATE TABLE IF NOT EXISTS maintenance_lease (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )''')
+
+
+@migration(6)
+def media(c):
+    add_column(c, "orders", "attachment_file_id", "TEXT")
+    # Какой file_id какому файлу в кэше media/ соответствует (по sha256)
+    c.execute('''CREATE TABLE IF NOT EXISTS media (
+        file_id TEXT PRIMARY KEY,
+        file_unique_id TEXT,
+        sha256 TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        name TEXT,
+        fetched_at REAL NOT NULL
+    )''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_media_unique ON media(file_unique_id)")
+
+
+# Сводка по дням (в часовом поясе студии), студиям и услугам. Ведётся
+# триггерами в той же транзакции, что и INSERT/DELETE заказа, поэтому
+# отчёты не зависят от размера истории и всегда сходятся с orders.
+STATS_KEY = "COALESCE({row}.day, date({row}.created_at)), COALESCE({row}.studio, ''), COALESCE({row}.service, '')"
+
+
+def _stats_add(row):
+    return f"""INSERT INTO daily_stats (day, studio, service, orders, revenue)
+               VALUES ({STATS_KEY.format(row=row)}, 1, COALESCE({row}.price, 0))
+               ON CONFLICT(day, studio, service) DO UPDATE
+               SET orders = orders + 1, revenue = revenue + excluded.revenue;"""
+
+
+def _stats_remove(row):
+    return f"""UPDATE daily_stats SET orders = orders - 1, revenue = revenue - COALESCE({row}.price, 0)
+               WHERE (day, studio, service) = ({STATS_KEY.format(row=row)});"""
+
+
+@migration(7)
+def daily_stats(c):
+    add_column(c, "orders", "day", "TEXT")
+    tz = ZoneInfo(DEFAULT_TIMEZONE)
+    days = {}
+
+    def local_day(created_at):
+        # Смещение пояса кратно 15 минутам: день зависит только от минуты
+        minute = (created_at or "")[:16]
+        if minute not in days:
+            try:
+                created = datetime.fromisoformat(minute).replace(tzinfo=timezone.utc)
+                days[minute] = created.astimezone(tz).date().isoformat()
+            except ValueError:
+                days[minute] = None
+        return days[minute]
+
+    c.connection.create_function("local_day", 1, local_day, deterministic=True)
+    c.execute("UPDATE orders SET day = local_day(created_at) WHERE day IS NULL")
+
+    c.execute('''CREATE TABLE IF NOT EXISTS daily_stats (
+        day TEXT NOT NULL,
+        studio TEXT NOT NULL,
+        service TEXT NOT NULL,
+        orders INTEGER NOT NULL,
+        revenue INTEGER NOT NULL,
+        PRIMARY KEY (day, studio, service)
+    ) WITHOUT ROWID''')
+    c.execute(f"""INSERT INTO daily_stats (day, studio, service, orders, revenue)
+                  SELECT {STATS_KEY.format(row="orders")}, COUNT(*), COALESCE(SUM(price), 0)
+                  FROM orders GROUP BY 1, 2, 3""")
+    c.execute(f"CREATE TRIGGER orders_stats_insert AFTER INSERT ON orders BEGIN {_stats_add('NEW')} END")
+    c.execute(f"CREATE TRIGGER orders_stats_delete AFTER DELETE ON orders BEGIN {_stats_remove('OLD')} END")
+    c.execute(f"""CREATE TRIGGER orders_stats_update AFTER UPDATE OF day, studio, service, price ON orders
+                  BEGIN {_stats_remove('OLD')} {_stats_add('NEW')} END""")
+
+
+@migration(8)
+def booking_slots(c):
+    add_column(c, "orders", "slot_at", "INTEGER")
+    # Будущие записи занимают свои слоты; при двойной записи слот достаётся
+    # первой, остальные администраторы уже разбирают вручную
+    c.execute("""UPDATE orders SET slot_at = CAST(appointment_at AS INTEGER)
+                 WHERE id IN (SELECT MIN(id) FROM orders
+                              WHERE service = 'photo_id' AND appointment_at >= ?
+                              GROUP BY studio, CAST(appointment_at AS INTEGER))""", (time.time(),))
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_slot ON orders(studio, slot_at) WHERE slot_at IS NOT NULL")
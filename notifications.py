@@ -0,0 +1,243 @@
+import asyncio
+import time
+
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramMigrateToChat,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+NOTIFY_RATE = 20          # сообщений в секунду в среднем
+NOTIFY_BURST = 20         # ёмкость «ведра»
+COALESCE_WINDOW = 0.5     # сколько ждать попутчиков для сводки, с
+MAX_ATTEMPTS = 8
+REQUEUE_DELAY = 60.0      # через сколько повторить то, что не удалось отправить, с
+MAX_MESSAGE_LENGTH = 4096
+DIGEST_SEPARATOR = "\n\n———\n\n"
+
+
+def parse_studio_admins(value):
+    # "1:111,222;3:333" -> {"1": [111, 222], "3": [333]}
+    result = {}
+    for part in (value or "").split(";"):
+        key, sep, ids = part.partition(":")
+        if not sep:
+            continue
+        result[key.strip()] = [int(i) for i in ids.split(",") if i.strip()]
+    return result
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# === УВЕДОМЛЕНИЯ АДМИНИСТРАТОРАМ ===
+# Обработчик только кладёт уведомление в очередь (и в таблицу
+# notification_outbox, чтобы оно пережило перезапуск) и сразу отвечает
+# клиенту. Фоновый воркер отправляет их с ограничением скорости, повторяет
+# при 429 с учётом retry_after и склеивает всплески в одну сводку на чат.
+# Неотправленное возвращается в очередь через REQUEUE_DELAY; если воркер
+# всё же упал, он перезапускается.
+class AdminNotifier:
+    def __init__(self, bot, repo, rate=NOTIFY_RATE, burst=NOTIFY_BURST,
+                 coalesce_window=COALESCE_WINDOW, max_attempts=MAX_ATTEMPTS):
+        self.bot = bot
+        self.repo = repo
+        self.bucket = TokenBucket(rate, burst)
+        self.coalesce_window = coalesce_window
+        self.max_attempts = max_attempts
+        self.queue = asyncio.Queue()
+        self.sent = 0
+        self.dropped = 0
+        self._worker = None
+        self._poller = None
+        self._closing = False
+        self._last_id = 0
+        self.drain = True
+        self.poll_interval = None
+
+    # --- SQL (поток-писатель) ---
+    def _insert(self, rows):
+        with self.repo.transaction() as c:
+            ids = []
+            for chat_id, text in rows:
+                c.execute("INSERT INTO notification_outbox (chat_id, text, created_at) VALUES (?, ?, ?)",
+                          (chat_id, text, time.time()))
+                ids.append(c.lastrowid)
+            return ids
+
+    def _delete(self, ids):
+        with self.repo.transaction() as c:
+            c.executemany("DELETE FROM notification_outbox WHERE id = ?", [(i,) for i in ids])
+
+    def _pending(self, after_id=0):
+        return self.repo.conn.execute(
+            "SELECT id, chat_id, text FROM notification_outbox WHERE id > ? ORDER BY id", (after_id,)).fetchall()
+
+    # --- интерфейс ---
+    async def notify(self, text, recipients):
+        chat_ids = list(dict.fromkeys(recipients))
+        ids = await self.repo.run(self._insert, [(chat_id, text) for chat_id in chat_ids])
+        if self.drain and not self.poll_interval:
+            for outbox_id, chat_id in zip(ids, chat_ids):
+                self.queue.put_nowait((outbox_id, chat_id, text))
+
+    async def start(self, drain=True, poll_interval=None):
+        # drain=False — процесс только пишет в outbox (несколько процессов
+        # на одной БД), poll_interval — отправитель сам забирает новые строки
+        # из outbox, которые добавили другие процессы.
+        self.drain = drain
+        self.poll_interval = poll_interval
+        if not drain:
+            return
+        # Источник правды — outbox: недоставленное до перезапуска и всё,
+        # что успели поставить до старта воркера, встаёт в очередь заново
+        self.queue = asyncio.Queue()
+        self._last_id = 0
+        await self._load_pending()
+        if self._worker is None:
+            self._closing = False
+            self._worker = asyncio.create_task(self._run())
+            self._worker.add_done_callback(self._worker_done)
+        if poll_interval and self._poller is None:
+            self._poller = asyncio.create_task(self._poll())
+
+    async def _load_pending(self):
+        for row in await self.repo.run(self._pending, self._last_id):
+            self.queue.put_nowait(tuple(row))
+            self._last_id = row[0]
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self._load_pending()
+            except Exception as e:
+                print(f"Не удалось прочитать outbox: {e}")
+
+    async def close(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+        if self._worker is not None:
+            # wait_for в Python 3.11 может проглотить отмену, если очередь
+            # отдала элемент в тот же момент, — поэтому ещё и флаг
+            self._closing = True
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    # --- воркер ---
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.coalesce_window
+        while True:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    @staticmethod
+    def _digests(items):
+        # Склеиваем тексты в сообщения не длиннее лимита Telegram
+        if len(items) == 1:
+            return [([items[0][0]], items[0][2][:MAX_MESSAGE_LENGTH])]
+        header = f"📬 Сводка: {len(items)} уведомл."
+        chunks, ids, text = [], [], header
+        for outbox_id, _, body in items:
+            body = body[:MAX_MESSAGE_LENGTH - len(header) - len(DIGEST_SEPARATOR)]
+            if ids and len(text) + len(DIGEST_SEPARATOR) + len(body) > MAX_MESSAGE_LENGTH:
+                chunks.append((ids, text))
+                ids, text = [], header
+            ids.append(outbox_id)
+            text += DIGEST_SEPARATOR + body
+        chunks.append((ids, text))
+        return chunks
+
+    async def _send(self, chat_id, text):
+        delay = 1.0
+        for attempt in range(1, self.max_attempts + 1):
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id, text)
+                return True
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except TelegramMigrateToChat as e:
+                # Группу админов преобразовали в супергруппу: у неё новый id
+                print(f"Чат {chat_id} теперь {e.migrate_to_chat_id}, обновите настройки администраторов")
+                chat_id = e.migrate_to_chat_id
+            except (TelegramNetworkError, TelegramServerError) as e:
+                if attempt == self.max_attempts:
+                    print(f"Уведомление для {chat_id} отложено: {e}")
+                    return None
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+            except TelegramAPIError as e:
+                # Forbidden, BadRequest, NotFound, Unauthorized…: повтор не поможет
+                print(f"Уведомление для {chat_id} не доставлено: {e}")
+                return False
+        return None
+
+    def _requeue(self, items):
+        # Остаётся в outbox; повторим позже, не дожидаясь перезапуска
+        for item in items:
+            self.queue.put_nowait(item)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while not self._closing:
+            batch = await self._collect()
+            by_chat = {}
+            for item in batch:
+                by_chat.setdefault(item[1], []).append(item)
+            for chat_id, items in by_chat.items():
+                by_id = {item[0]: item for item in items}
+                for ids, text in self._digests(items):
+                    try:
+                        delivered = await self._send(chat_id, text)
+                    except Exception as e:
+                        print(f"Ошибка отправки уведомления для {chat_id}: {e!r}")
+                        delivered = None
+                    if delivered is None:
+                        loop.call_later(REQUEUE_DELAY, self._requeue, [by_id[i] for i in ids])
+                        continue
+                    if delivered:
+                        self.sent += len(ids)
+                    else:
+                        self.dropped += len(ids)
+                    try:
+                        await self.repo.run(self._delete, ids)
+                    except Exception as e:
+                        # Строки останутся в outbox и уйдут повторно после перезапуска
+                        print(f"Не удалось удалить из outbox {ids}: {e!r}")
+
+    def _worker_done(self, task):
+        if task is not self._worker or self._closing or task.cancelled():
+            return
+        print(f"Воркер уведомлений остановился: {task.exception()!r}, перезапуск")
+        self._worker = asyncio.create_task(self._run())
+        self._worker.add_done_callback(self._worker_done)
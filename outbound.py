@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter
+
+HTTP_POOL_SIZE = 100       # одновременных соединений с Bot API
+HTTP_KEEPALIVE = 75        # сколько держать простаивающее соединение, с
+FLOOD_MAX_WAIT = 60        # дольше суммарно не ждём — отдаём ошибку вызывающему
+FLOOD_MAX_ATTEMPTS = 5
+
+
+# === СЕССИЯ BOT API ===
+# Все запросы идут на один хост, поэтому пул — на хост целиком, а
+# соединения живут дольше стандартных 15 с aiohttp: между всплесками
+# ответов не приходится заново делать TCP и TLS рукопожатие. Если после
+# обновления aiogram настройки пула не дойдут до коннектора, create_session
+# упадёт, а не продолжит молча работать с пулом по умолчанию.
+class BotApiSession(AiohttpSession):
+    def __init__(self, api_url=None, pool_size=HTTP_POOL_SIZE, keepalive=HTTP_KEEPALIVE, **kwargs):
+        api = TelegramAPIServer.from_base(api_url) if api_url else PRODUCTION
+        super().__init__(api=api, limit=pool_size, **kwargs)
+        self.pool_size = pool_size
+        self._connector_init.update(limit_per_host=pool_size, keepalive_timeout=keepalive,
+                                    enable_cleanup_closed=True)
+
+    async def create_session(self):
+        session = await super().create_session()
+        if session.connector.limit_per_host != self.pool_size:
+            raise RuntimeError("Настройки пула соединений не применились: проверьте совместимость с версией aiogram")
+        return session
+
+
+# === FLOOD CONTROL ===
+# Middleware сессии Bot API: на 429 ждёт retry_after и повторяет запрос,
+# а пока чат «на паузе», остальные запросы в этот чат ждут заранее, не
+# собирая новых 429. Обработчикам и уведомлениям не нужно ловить
+# TelegramRetryAfter самим; исключение доходит до них, только если
+# ожидание превысило max_wait.
+class FloodControlMiddleware(BaseRequestMiddleware):
+    def __init__(self, max_wait=FLOOD_MAX_WAIT, max_attempts=FLOOD_MAX_ATTEMPTS):
+        self.max_wait = max_wait
+        self.max_attempts = max_attempts
+        self._paused = {}   # chat_id (None — весь бот) -> monotonic, до которого ждать
+        self.stats = {"retried": 0, "gave_up": 0, "waited_ms": 0}
+
+    async def _wait(self, chat_id):
+        until = max(self._paused.get(chat_id, 0), self._paused.get(None, 0))
+        delay = until - time.monotonic()
+        if delay > 0:
+            self.stats["waited_ms"] += int(delay * 1000)
+            await asyncio.sleep(delay)
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        waited = 0.0
+        for attempt in range(1, self.max_attempts + 1):
+            await self._wait(chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                waited += e.retry_after
+                if attempt == self.max_attempts or waited > self.max_wait:
+                    self.stats["gave_up"] += 1
+                    raise
+                self.stats["retried"] += 1
+                until = time.monotonic() + e.retry_after
+                self._paused[chat_id] = max(self._paused.get(chat_id, 0), until)
+                self._cleanup()
+
+    def _cleanup(self):
+        if len(self._paused) > 1000:
+            now = time.monotonic()
+            self._paused = {k: v for k, v in self._paused.items() if v > now}
+
+
+async def _send(call):
+    return await call
+
+
+async def send_together(*calls):
+    # Независимые отправки (ответ клиенту, уведомление админам) — параллельно.
+    # Методы aiogram не хешируются, а asyncio.gather требует хешируемых, поэтому обёртка
+    return await asyncio.gather(*(_send(call) for call in calls))
@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+PHOTO_BATCH_SIZE = 20
+PHOTO_FLUSH_DELAY = 1.0
+ALBUM_SETTLE_DELAY = 0.7
+FINISHED_TTL = 300          # сколько помнить завершённые заказы, с
+
+
+# === БУФЕР ФОТО ДЛЯ ФОТОПЕЧАТИ ===
+# file_id копятся в памяти по заказам и пишутся в БД пачкой (executemany,
+# одна транзакция) по размеру пачки или через короткую задержку.
+# Счётчик полученных фото живёт в памяти и при первом обращении к заказу
+# сверяется с тем, что уже лежит в БД (например, после перезапуска).
+# Завершённый заказ какое-то время помнится вместе со счётчиком: фото,
+# пришедшие одновременно с последним, не считают его заново из БД.
+class PhotoBuffer:
+    def __init__(self, repo, batch_size=PHOTO_BATCH_SIZE, flush_delay=PHOTO_FLUSH_DELAY,
+                 album_delay=ALBUM_SETTLE_DELAY):
+        self.repo = repo
+        self.batch_size = batch_size
+        self.flush_delay = flush_delay
+        self.album_delay = album_delay
+        self._pending = {}
+        self._counts = {}
+        self._timers = {}
+        self._albums = {}
+        self._finished = {}     # order_id -> monotonic, когда заказ завершён
+        self._tasks = set()
+
+    async def add(self, order_id, file_id):
+        if order_id not in self._counts:
+            persisted = await self.repo.count_photos(order_id)
+            self._counts.setdefault(order_id, persisted)
+        self._counts[order_id] += 1
+        self._pending.setdefault(order_id, []).append(file_id)
+
+        if len(self._pending[order_id]) >= self.batch_size:
+            await self.flush(order_id)
+        elif order_id not in self._timers:
+            loop = asyncio.get_running_loop()
+            self._timers[order_id] = loop.call_later(self.flush_delay, self._schedule_flush, order_id)
+        return self._counts[order_id]
+
+    def received(self, order_id):
+        return self._counts.get(order_id, 0)
+
+    def pending(self):
+        return sum(len(ids) for ids in self._pending.values())
+
+    def _schedule_flush(self, order_id):
+        self._timers.pop(order_id, None)
+        task = asyncio.create_task(self.flush(order_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self, order_id):
+        timer = self._timers.pop(order_id, None)
+        if timer:
+            timer.cancel()
+        file_ids = self._pending.pop(order_id, None)
+        if file_ids:
+            await self.repo.add_photos(order_id, file_ids)
+
+    async def finish(self, order_id):
+        # True только для первого вызова: защищает от двойного завершения
+        # заказа, когда несколько фото приходят одновременно
+        if order_id in self._finished or order_id not in self._counts:
+            return False
+        self._forget_finished()
+        self._finished[order_id] = time.monotonic()
+        await self.flush(order_id)
+        return True
+
+    def _forget_finished(self):
+        deadline = time.monotonic() - FINISHED_TTL
+        for order_id, finished_at in list(self._finished.items()):
+            if finished_at > deadline:
+                break
+            del self._finished[order_id]
+            self._counts.pop(order_id, None)
+
+    def discard(self, order_id):
+        timer = self._timers.pop(order_id, None)
+        if timer:
+            timer.cancel()
+        self._pending.pop(order_id, None)
+        self._counts.pop(order_id, None)
+        self._finished.pop(order_id, None)
+
+    async def settle_album(self, media_group_id):
+        # Telegram присылает альбом отдельными сообщениями. Ждём паузу после
+        # последнего фото альбома — отвечает только обработчик последнего.
+        token = self._albums.get(media_group_id, 0) + 1
+        self._albums[media_group_id] = token
+        await asyncio.sleep(self.album_delay)
+        if self._albums.get(media_group_id) != token:
+            return False
+        del self._albums[media_group_id]
+        return True
+
+    async def close(self):
+        for order_id in list(self._pending):
+            await self.flush(order_id)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,199 @@
+import json
+import os
+import time
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+PRICES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prices.json")
+RELOAD_CHECK_INTERVAL = 1.0
+
+# === ПРАЙС-ЛИСТ ===
+# prices.json:
+#   services.<услуга>.items       — надпись кнопки → цена за штуку (null — цена по запросу)
+#   services.<услуга>.surcharges  — опция (например, «Матовая») → надбавка за штуку
+#   services.<услуга>.tiers       — [[от_количества, скидка_%], ...]
+#   studios.<номер студии>.<услуга> — переопределение любых полей выше для одной студии
+# Файл перечитывается на лету, когда меняется его mtime.
+
+
+class UnknownItem(KeyError):
+    # Позиции (или услуги) нет в текущем прайсе — например, её убрали из prices.json
+    pass
+
+
+class Quote(NamedTuple):
+    unit: int
+    surcharge: int
+    quantity: int
+    subtotal: int
+    discount: int
+    total: int
+
+
+class PriceTable:
+    def __init__(self, path=PRICES_PATH, check_interval=RELOAD_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self.version = 0
+        self._mtime = None
+        self._checked = 0.0
+        self._services = {}
+        self._studios = {}
+        self.reload()
+
+    @classmethod
+    def from_dict(cls, data):
+        table = cls.__new__(cls)
+        table.path = None
+        table.check_interval = RELOAD_CHECK_INTERVAL
+        table.version = 0
+        table._mtime = None
+        table._checked = 0.0
+        table._apply(data)
+        return table
+
+    def _apply(self, data):
+        services = data.get("services") or {}
+        for name, service in services.items():
+            if not service.get("items"):
+                raise ValueError(f"У услуги {name} нет позиций")
+        self._services = services
+        self._studios = data.get("studios") or {}
+        self.version += 1
+
+    def reload(self):
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        self._mtime = os.stat(self.path).st_mtime
+        self._apply(data)
+
+    def maybe_reload(self):
+        if self.path is None:
+            return
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        try:
+            if os.stat(self.path).st_mtime != self._mtime:
+                self.reload()
+        except (OSError, ValueError) as e:
+            # Битый файл не должен ронять бота: остаёмся на прежних ценах
+            print(f"Не удалось перечитать прайс {self.path}: {e}")
+
+    def items(self, service):
+        return list(self._services.get(service, {}).get("items", ()))
+
+    def _rules(self, service, studio):
+        rules = dict(self._services[service])
+        override = self._studios.get(studio, {}).get(service)
+        if override:
+            for field, value in override.items():
+                if isinstance(value, dict):
+                    rules[field] = {**rules.get(field, {}), **value}
+                else:
+                    rules[field] = value
+        return rules
+
+    @lru_cache(maxsize=4096)
+    def _unit_rules(self, version, service, studio, item, options):
+        # Цена за штуку, надбавка и ступени скидок для одной комбинации
+        rules = self._rules(service, studio)
+        unit = rules["items"][item]
+        if unit is None:
+            return None
+        surcharges = rules.get("surcharges", {})
+        surcharge = sum(surcharges.get(option, 0) for option in options)
+        tiers = sorted(rules.get("tiers", []))
+        return unit, surcharge, tuple(t[0] for t in tiers), tuple(t[1] for t in tiers)
+
+    def unit_rules(self, service, item, studio=None, options=()):
+        self.maybe_reload()
+        try:
+            return self._unit_rules(self.version, service, studio, item, tuple(options))
+        except KeyError:
+            raise UnknownItem(service, item) from None
+
+    @staticmethod
+    def _price(rules, quantity):
+        unit, surcharge, thresholds, percents = rules
+        subtotal = (unit + surcharge) * quantity
+        tier = bisect_right(thresholds, quantity)
+        discount = subtotal * percents[tier - 1] // 100 if tier else 0
+        return Quote(unit, surcharge, quantity, subtotal, discount, subtotal - discount)
+
+    def quote(self, service, item, quantity=1, studio=None, options=()):
+        # None — позиция без фиксированной цены (сувениры «по запросу»)
+        rules = self.unit_rules(service, item, studio, options)
+        return self._price(rules, quantity) if rules else None
+
+    # --- пакетный пересчёт ---
+    def reprice(self, orders):
+        # orders: последовательность (service, studio, item, quantity, options).
+        # Правила вычисляются один раз на уникальную комбинацию, количество и
+        # итоги лежат в плоских массивах. Для позиций без цены итог равен -1.
+        self.maybe_reload()
+        groups = {}
+        for index, (service, studio, item, quantity, options) in enumerate(orders):
+            groups.setdefault((service, studio, item, tuple(options or ())), []).append(index)
+        quantities = array("q", (order[3] or 0 for order in orders))
+        totals = array("q", bytes(8 * len(quantities)))
+        for (service, studio, item, options), indexes in groups.items():
+            try:
+                rules = self._unit_rules(self.version, service, studio, item, options)
+            except KeyError:
+                rules = None
+            if rules is None:
+                for i in indexes:
+                    totals[i] = -1
+                continue
+            unit, surcharge, thresholds, percents = rules
+            per_piece = unit + surcharge
+            for i in indexes:
+                qty = quantities[i]
+                subtotal = per_piece * qty
+                tier = bisect_right(thresholds, qty)
+                totals[i] = subtotal - (subtotal * percents[tier - 1] // 100 if tier else 0)
+        return totals
+
+    def revenue(self, orders, keys):
+        # Сумма пересчитанных итогов по ключам (например, день/студия)
+        report = {}
+        for key, total in zip(keys, self.reprice(orders)):
+            if total >= 0:
+                report[key] = report.get(key, 0) + total
+        return report
+
+
+def simulate(orders, current, proposed):
+    # «Что если»: выручка по тем же заказам в текущем и новом прайсе
+    before = sum(t for t in current.reprice(orders) if t >= 0)
+    after = sum(t for t in proposed.reprice(orders) if t >= 0)
+    return {"before": before, "after": after, "delta": after - before}
+
+
+def format_price(quote: Optional[Quote]):
+    return f"{quote.total} ₽" if quote else "по запросу"
+
+
+def historical_orders(conn, studio_keys, since=None, until=None, chunk=10000):
+    # Заказы из БД в формате reprice() и ключи (день, услуга) для отчётов
+    query = "SELECT service, studio, item, quantity, paper, date(created_at) FROM orders WHERE item IS NOT NULL"
+    params = []
+    if since:
+        query += " AND created_at >= ?"
+        params.append(since)
+    if until:
+        query += " AND created_at < ?"
+        params.append(until)
+    orders, keys = [], []
+    cursor = conn.execute(query, params)
+    while True:
+        rows = cursor.fetchmany(chunk)
+        if not rows:
+            return orders, keys
+        for service, studio, item, quantity, paper, day in rows:
+            orders.append((service, studio_keys.get(studio), item, quantity or 1, (paper,) if paper else ()))
+            keys.append((day, service))
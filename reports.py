@@ -0,0 +1,133 @@
+import csv
+import io
+import re
+from datetime import date, datetime, time, timedelta, timezone
+
+from aiogram.types import InputFile
+
+EXPORT_CHUNK = 2000
+EXPORT_COLUMNS = ("id", "created_at", "studio", "service", "item", "paper", "quantity", "price",
+                  "username", "phone", "appointment_time")
+
+_DAY = re.compile(r"^(\d{1,2})\.(\d{1,2})(?:\.(\d{4}))?$")
+
+
+def parse_day(text, today):
+    # "2026-10-01", "01.10.2026" или "01.10" (текущий год)
+    text = (text or "").strip()
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        pass
+    match = _DAY.match(text)
+    if not match:
+        return None
+    try:
+        return date(int(match.group(3) or today.year), int(match.group(2)), int(match.group(1)))
+    except ValueError:
+        return None
+
+
+def format_money(value):
+    return f"{value:,}".replace(",", " ") + " ₽"
+
+
+# === ОТЧЁТЫ ДЛЯ АДМИНИСТРАТОРОВ ===
+# Сводки читаются из daily_stats (её ведут триггеры на orders), поэтому
+# стоят одинаково при любом объёме истории. Выгрузка заказов в CSV идёт
+# кусками по EXPORT_CHUNK строк через поток-писатель прямо в тело запроса
+# sendDocument: ни таблица, ни файл целиком в памяти не собираются.
+class Reports:
+    def __init__(self, repo, timezone):
+        self.repo = repo
+        self.timezone = timezone
+
+    @staticmethod
+    def _studio_filter(studios, params):
+        if studios is None:
+            return ""
+        params.extend(studios)
+        return f" AND studio IN ({', '.join('?' * len(studios))})"
+
+    # --- SQL (поток-писатель) ---
+    def _totals(self, start, end, studios):
+        params = [start.isoformat(), end.isoformat()]
+        where = self._studio_filter(studios, params)
+        return self.repo.conn.execute(
+            f'''SELECT studio, service, SUM(orders), SUM(revenue) FROM daily_stats
+                WHERE day BETWEEN ? AND ?{where} GROUP BY studio, service HAVING SUM(orders) > 0''',
+            params).fetchall()
+
+    def _export_chunk(self, since, until, studios, after):
+        # Ключ (created_at, id) вместо OFFSET: каждый кусок — короткий проход по индексу
+        params = [since, until, *after]
+        where = self._studio_filter(studios, params)
+        params.append(EXPORT_CHUNK)
+        return self.repo.conn.execute(
+            f'''SELECT {", ".join(EXPORT_COLUMNS)} FROM orders
+                WHERE created_at >= ? AND created_at < ? AND (created_at, id) > (?, ?){where}
+                ORDER BY created_at, id LIMIT ?''', params).fetchall()
+
+    # --- интерфейс ---
+    def today(self):
+        return datetime.now(self.timezone).date()
+
+    async def totals(self, start, end, studios=None):
+        # -> [(студия, услуга, заказов, выручка)]; studios=None — все студии
+        return await self.repo.run(self._totals, start, end, None if studios is None else list(studios))
+
+    def _utc(self, day):
+        local = datetime.combine(day, time(), self.timezone)
+        return local.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+    async def export_csv(self, start, end, studios=None):
+        since, until = self._utc(start), self._utc(end + timedelta(days=1))
+        studios = None if studios is None else list(studios)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=";")
+        writer.writerow(EXPORT_COLUMNS)
+        yield "﻿".encode() + buffer.getvalue().encode()  # BOM — чтобы Excel понял UTF-8
+        after = ("", 0)
+        while True:
+            rows = await self.repo.run(self._export_chunk, since, until, studios, after)
+            if not rows:
+                break
+            buffer.seek(0)
+            buffer.truncate()
+            for row in rows:
+                created = datetime.fromisoformat(row[1]).replace(tzinfo=timezone.utc).astimezone(self.timezone)
+                writer.writerow((row[0], created.strftime("%Y-%m-%d %H:%M"), *row[2:]))
+            yield buffer.getvalue().encode()
+            after = (rows[-1][1], rows[-1][0])
+
+
+class CsvInputFile(InputFile):
+    # make_chunks() -> новый асинхронный генератор: при повторе запроса
+    # (например, после 429) выгрузка читается заново, а не пустой
+    def __init__(self, make_chunks, filename):
+        super().__init__(filename=filename)
+        self.make_chunks = make_chunks
+
+    async def read(self, bot):
+        async for chunk in self.make_chunks():
+            yield chunk
+
+
+def format_totals(title, rows, studio_labels, service_titles, breakdown=True):
+    if not rows:
+        return f"{title}: заказов нет"
+    orders = sum(r[2] for r in rows)
+    revenue = sum(r[3] for r in rows)
+    lines = [f"{title}: {orders} заказ(ов), {format_money(revenue)}"]
+    if not breakdown:
+        return lines[0]
+    for label, index, names in (("По студиям", 0, studio_labels), ("По услугам", 1, service_titles)):
+        groups = {}
+        for row in rows:
+            key = row[index]
+            count, money = groups.get(key, (0, 0))
+            groups[key] = (count + row[2], money + row[3])
+        lines.append(f"{label}:")
+        for key, (count, money) in sorted(groups.items(), key=lambda g: -g[1][1]):
+            lines.append(f"  {names.get(key) or key or 'без студии'} — {count}, {format_money(money)}")
+    return "\n".join(lines)
@@ -0,0 +1,157 @@
+import os
+import re
+from typing import NamedTuple, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from dotenv import load_dotenv
+
+from appointments import DEFAULT_TIMEZONE
+from booking import OPENING_HOURS, SLOT_MINUTES, parse_hours
+from db import DB_PATH
+from maintenance import STALE_ORDER_AGE
+from media import DOWNLOAD_CONCURRENCY, MEDIA_CACHE_BYTES, MEDIA_DIR
+from notifications import parse_studio_admins
+from outbound import HTTP_POOL_SIZE
+from pricing import PRICES_PATH
+from throttling import GLOBAL_LIMIT, USER_LIMIT, parse_limit
+
+STARTUP_TIMEOUT = 30.0
+MODES = ("polling", "webhook")
+# Telegram принимает secret_token из 1–256 символов A-Z, a-z, 0-9, _ и -
+WEBHOOK_SECRET_RE = re.compile(r"[A-Za-z0-9_-]{1,256}")
+
+
+class SettingsError(ValueError):
+    pass
+
+
+# === НАСТРОЙКИ ===
+# Всё, что бот читает из окружения (и .env), разбирается и проверяется в
+# одном месте. Ошибки собираются все сразу: при запуске видно полный
+# список того, что нужно исправить, а не первую упавшую строку.
+class Settings(NamedTuple):
+    bot_token: str
+    admin_id: int
+    bot_api_url: Optional[str] = None   # свой Bot API сервер (локальный или тестовый)
+    http_pool_size: int = HTTP_POOL_SIZE
+    db_path: str = DB_PATH
+    prices_path: str = PRICES_PATH
+
+    # Режим получения обновлений и число процессов-обработчиков
+    mode: str = "polling"
+    workers: int = 1
+    webhook_url: Optional[str] = None   # публичный адрес, например https://bot.example.com
+    webhook_path: str = "/webhook"
+    webhook_secret: Optional[str] = None
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+
+    # Доп. получатели уведомлений по студиям: {"1": [111, 222]}
+    studio_admins: dict = {}
+
+    timezone: ZoneInfo = ZoneInfo(DEFAULT_TIMEZONE)
+    stale_order_hours: float = STALE_ORDER_AGE / 3600
+    booking_slot_minutes: int = SLOT_MINUTES
+    booking_hours: tuple = OPENING_HOURS
+
+    media_dir: str = MEDIA_DIR
+    media_cache_mb: int = MEDIA_CACHE_BYTES // 2 ** 20
+    media_downloads: int = DOWNLOAD_CONCURRENCY
+
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 9100
+    metrics_log_interval: float = 300.0
+    profile_rate: float = 0.0
+    profile_slow_seconds: float = 1.0
+
+    throttle_user_limit: tuple = USER_LIMIT
+    throttle_global_limit: tuple = GLOBAL_LIMIT
+
+    startup_timeout: float = STARTUP_TIMEOUT
+
+    @property
+    def admin_ids(self):
+        return {self.admin_id, *(i for ids in self.studio_admins.values() for i in ids)}
+
+    @classmethod
+    def from_env(cls, environ=None):
+        env = os.environ if environ is None else environ
+        errors = []
+        values = {}
+
+        def read(field, name, parse=str, check=None, message=None):
+            raw = env.get(name)
+            if raw is None or raw == "":
+                return
+            try:
+                value = parse(raw)
+            except (ValueError, ZoneInfoNotFoundError) as e:
+                errors.append(f"{name}={raw!r}: {e}")
+                return
+            if check is not None and not check(value):
+                errors.append(f"{name}={raw!r}: {message}")
+                return
+            values[field] = value
+
+        for name in ("BOT_TOKEN", "ADMIN_ID"):
+            if not env.get(name):
+                errors.append(f"{name} не задан")
+        read("bot_token", "BOT_TOKEN", check=lambda v: ":" in v, message="токен вида 123456:ABC…")
+        read("admin_id", "ADMIN_ID", int)
+        read("bot_api_url", "BOT_API_URL")
+        read("http_pool_size", "HTTP_POOL_SIZE", int, lambda v: v >= 1, "не меньше 1")
+        read("db_path", "DB_PATH")
+        read("prices_path", "PRICES_PATH")
+
+        read("mode", "BOT_MODE", check=lambda v: v in MODES, message=f"допустимо: {', '.join(MODES)}")
+        read("workers", "BOT_WORKERS", int, lambda v: v >= 1, "не меньше 1")
+        read("webhook_url", "WEBHOOK_URL")
+        read("webhook_path", "WEBHOOK_PATH", check=lambda v: v.startswith("/"), message="путь начинается с /")
+        read("webhook_secret", "WEBHOOK_SECRET", check=WEBHOOK_SECRET_RE.fullmatch,
+             message="1–256 символов A-Z, a-z, 0-9, _ и -")
+        read("webhook_host", "WEBHOOK_HOST")
+        read("webhook_port", "WEBHOOK_PORT", int, lambda v: 0 < v < 65536, "порт 1–65535")
+
+        read("studio_admins", "STUDIO_ADMINS", parse_studio_admins)
+
+        read("timezone", "BOT_TIMEZONE", ZoneInfo)
+        read("stale_order_hours", "STALE_ORDER_HOURS", float, lambda v: v > 0, "больше 0")
+        read("booking_slot_minutes", "BOOKING_SLOT_MINUTES", int, lambda v: 0 < v <= 24 * 60, "от 1 до 1440")
+        read("booking_hours", "BOOKING_HOURS", parse_hours)
+
+        read("media_dir", "MEDIA_DIR")
+        read("media_cache_mb", "MEDIA_CACHE_MB", int, lambda v: v > 0, "больше 0")
+        read("media_downloads", "MEDIA_DOWNLOADS", int, lambda v: v >= 1, "не меньше 1")
+
+        read("metrics_host", "METRICS_HOST")
+        read("metrics_port", "METRICS_PORT", int, lambda v: 0 <= v < 65536, "порт 0–65535 (0 — выключить)")
+        read("metrics_log_interval", "METRICS_LOG_INTERVAL", float, lambda v: v >= 0, "не меньше 0")
+        read("profile_rate", "PROFILE_RATE", float, lambda v: 0 <= v <= 1, "доля от 0 до 1")
+        read("profile_slow_seconds", "PROFILE_SLOW_SECONDS", float, lambda v: v >= 0, "не меньше 0")
+
+        limit = lambda raw: parse_limit(raw, None)
+        positive = lambda v: v[0] > 0 and v[1] > 0
+        read("throttle_user_limit", "THROTTLE_USER_LIMIT", limit, positive, "формат сообщений/секунд, например 20/10")
+        read("throttle_global_limit", "THROTTLE_GLOBAL_LIMIT", limit, positive, "формат сообщений/секунд")
+
+        read("startup_timeout", "STARTUP_TIMEOUT", float, lambda v: v > 0, "больше 0")
+
+        opens, closes = values.get("booking_hours", OPENING_HOURS)
+        slot = values.get("booking_slot_minutes", SLOT_MINUTES)
+        if closes - opens < slot:
+            errors.append(f"BOOKING_SLOT_MINUTES={slot} длиннее часов работы BOOKING_HOURS")
+        if values.get("mode") == "webhook":
+            # Без секрета кто угодно может прислать на открытый порт поддельное обновление
+            for field, name in (("webhook_url", "WEBHOOK_URL"), ("webhook_secret", "WEBHOOK_SECRET")):
+                if not values.get(field) and not env.get(name):
+                    errors.append(f"{name} обязателен в режиме webhook")
+        if errors:
+            raise SettingsError("Ошибки в настройках:\n  " + "\n  ".join(errors))
+        return cls(**values)
+
+
+def load_settings(environ=None):
+    # .env не перекрывает уже заданные переменные окружения
+    if environ is None:
+        load_dotenv()
+    return Settings.from_env(environ)
@@ -0,0 +1,308 @@
+import asyncio
+import hmac
+import itertools
+import json
+import multiprocessing
+import signal
+import socket
+import time
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, web
+
+WATCH_INTERVAL = 1.0
+STOP_TIMEOUT = 30
+POLL_TIMEOUT = 30
+LINE_LIMIT = 2 ** 24       # обновление — одна строка JSON
+
+
+def extract_chat_id(update):
+    # Ключ шардирования: чат, а если его нет — отправитель
+    for value in update.values():
+        if not isinstance(value, dict):
+            continue
+        message = value.get("message") if "message" in value else value
+        if isinstance(message, dict) and isinstance(message.get("chat"), dict):
+            return message["chat"]["id"]
+        if isinstance(value.get("from"), dict):
+            return value["from"]["id"]
+    return 0
+
+
+def extract_media_group(update):
+    # Альбом: несколько сообщений с одним media_group_id
+    message = update.get("message")
+    return message.get("media_group_id") if isinstance(message, dict) else None
+
+
+def shard_for(chat_id, workers):
+    return chat_id % workers
+
+
+# === ПРОЦЕСС-ОБРАБОТЧИК ===
+# Свой цикл событий, свой Dispatcher из main.py. Обновления одного чата
+# выполняются строго по очереди (цепочка задач на чат), разных чатов —
+# параллельно. Фото одного альбома — один шаг цепочки: они ждут то, что
+# было до альбома, но идут одновременно, как без --workers, иначе
+# PhotoBuffer.settle_album не склеит их в один ответ. БД и FSM общие:
+# bot.db в режиме WAL, а так как чат всегда попадает в один и тот же
+# процесс, LRU-кэш FSM в нём не устаревает.
+#
+# С супервизором процесс связан своей парой сокетов: строка JSON на
+# обновление туда, «+seq» (начато) и «-seq» (готово) обратно. Общих
+# блокировок нет, поэтому убитый процесс не мешает своему преемнику.
+def worker_entry(index, sock, events=None, session_factory=None):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # останавливает супервизор
+    asyncio.run(_worker(index, sock, events, session_factory))
+
+
+async def _worker(index, sock, events, session_factory):
+    import main
+
+    reader, writer = await asyncio.open_connection(sock=sock, limit=LINE_LIMIT)
+    # Настройки — из того же окружения, что у супервизора
+    session = session_factory() if session_factory is not None else None
+    app = main.create_app(session=session)
+    await app.start(worker=index)
+    if events is not None:
+        events.put(("ready", index, time.monotonic()))
+
+    # chat_id -> (media_group_id, задачи предыдущего шага, задачи текущего шага)
+    steps = {}
+
+    async def process(seq, chat_id, update, prior):
+        if prior:
+            await asyncio.gather(*prior, return_exceptions=True)
+        writer.write(b"+%d\n" % seq)
+        try:
+            await app.dp.feed_raw_update(app.bot, update)
+        except Exception as e:
+            print(f"Обработчик {index}: ошибка в обновлении {update.get('update_id')}: {e}")
+        finally:
+            writer.write(b"-%d\n" % seq)
+            if events is not None:
+                events.put(("done", update.get("update_id"), time.monotonic()))
+            step = steps.get(chat_id)
+            current = asyncio.current_task()
+            if step is not None and all(t is current or t.done() for t in step[2]):
+                del steps[chat_id]
+
+    try:
+        # EOF — супервизор останавливает процесс (или сам завершился)
+        while line := await reader.readline():
+            item = json.loads(line)
+            chat_id, update = item["chat"], item["update"]
+            group = extract_media_group(update)
+            step = steps.get(chat_id)
+            if group is None or step is None or step[0] != group:
+                step = steps[chat_id] = (group, step[2] if step else [], [])
+            step[2].append(asyncio.create_task(process(item["seq"], chat_id, update, step[1])))
+        running = [task for step in steps.values() for task in step[2]]
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+    finally:
+        await app.close()
+        writer.close()
+        if events is not None and session is not None:
+            events.put(("calls", index, dict(getattr(session, "calls", {}))))
+
+
+# === СУПЕРВИЗОР ===
+class Supervisor:
+    def __init__(self, workers, events=None, session_factory=None):
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = workers
+        self.events = events
+        self.session_factory = session_factory
+        self.processes = [None] * workers
+        self.channels = [None] * workers
+        self.acks = [None] * workers
+        # Отправленное процессу, но ещё не начатое: при перезапуске уходит
+        # новому процессу в том же порядке
+        self.unacked = [{} for _ in range(workers)]
+        self.started = [set() for _ in range(workers)]
+        self.restarts = 0
+        self.dispatched = 0
+        self.lost = 0
+        self._seq = itertools.count()
+        self._stopping = False
+
+    async def _spawn(self, index):
+        self.channels[index] = None
+        parent, child = socket.socketpair()
+        process = self.context.Process(
+            target=worker_entry, name=f"bot-worker-{index}",
+            args=(index, child, self.events, self.session_factory))
+        process.start()
+        child.close()
+        reader, writer = await asyncio.open_connection(sock=parent, limit=LINE_LIMIT)
+        self.processes[index] = process
+        self.acks[index] = asyncio.create_task(self._read_acks(index, reader))
+        self.channels[index] = writer
+        for seq, item in self.unacked[index].items():
+            self._send(index, seq, item)
+
+    async def _read_acks(self, index, reader):
+        unacked, started = self.unacked[index], self.started[index]
+        try:
+            while line := await reader.readline():
+                seq = int(line[1:])
+                if line[:1] == b"+":
+                    unacked.pop(seq, None)
+                    started.add(seq)
+                else:
+                    started.discard(seq)
+        except ConnectionError:
+            pass  # процесс убит, не дочитав отправленное
+
+    async def start(self):
+        for index in range(self.workers):
+            await self._spawn(index)
+
+    def _send(self, index, seq, item):
+        writer = self.channels[index]
+        if writer is not None and not writer.is_closing():
+            writer.write(json.dumps({"seq": seq, "chat": item[0], "update": item[1]}).encode() + b"\n")
+
+    def dispatch(self, update):
+        # Запись в сокет буферизуется транспортом и не блокирует цикл;
+        # порядок обновлений одного чата сохраняется
+        chat_id = extract_chat_id(update)
+        index = shard_for(chat_id, self.workers)
+        seq = next(self._seq)
+        self.unacked[index][seq] = (chat_id, update)
+        self._send(index, seq, (chat_id, update))
+        self.dispatched += 1
+
+    async def _restart(self, index, process):
+        # Что процесс не начал — получит новый; что он обрабатывал в момент
+        # падения — потеряно (могло выполниться частично, повтор опаснее).
+        # Сначала дочитываем подтверждения, которые он успел прислать.
+        old = self.channels[index]
+        self.channels[index] = None
+        await self.acks[index]
+        if old is not None:
+            old.close()
+        lost = len(self.started[index])
+        self.lost += lost
+        self.started[index].clear()
+        print(f"Обработчик {index} завершился с кодом {process.exitcode}, перезапуск; "
+              f"повторно {len(self.unacked[index])} обновл., потеряно {lost}")
+        self.restarts += 1
+        await self._spawn(index)
+
+    async def watch(self):
+        while not self._stopping:
+            await asyncio.sleep(WATCH_INTERVAL)
+            for index, process in enumerate(self.processes):
+                if not self._stopping and process is not None and not process.is_alive():
+                    try:
+                        await self._restart(index, process)
+                    except Exception as e:
+                        print(f"Не удалось перезапустить обработчик {index}: {e!r}")
+
+    async def stop(self, timeout=STOP_TIMEOUT):
+        # Конец потока — сигнал процессу доделать начатое и выйти
+        self._stopping = True
+        for writer in self.channels:
+            if writer is not None and not writer.is_closing():
+                writer.write_eof()
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join, max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+        for writer in self.channels:
+            if writer is not None:
+                writer.close()
+        await asyncio.gather(*(task for task in self.acks if task), return_exceptions=True)
+
+
+# === ПРИЁМ ОБНОВЛЕНИЙ ===
+async def poll_updates(supervisor, bot, allowed_updates):
+    url = bot.session.api.api_url(token=bot.token, method="getUpdates")
+    offset = None
+    async with ClientSession(timeout=ClientTimeout(total=POLL_TIMEOUT + 10)) as http:
+        while True:
+            form = {"timeout": str(POLL_TIMEOUT), "allowed_updates": json.dumps(allowed_updates)}
+            if offset is not None:
+                form["offset"] = str(offset)
+            try:
+                async with http.post(url, data=form) as resp:
+                    payload = await resp.json(content_type=None)
+            except (ClientError, asyncio.TimeoutError, ValueError) as e:
+                print(f"getUpdates: {e}")
+                await asyncio.sleep(1)
+                continue
+            if not payload.get("ok"):
+                await asyncio.sleep((payload.get("parameters") or {}).get("retry_after", 1))
+                continue
+            for update in payload["result"]:
+                supervisor.dispatch(update)
+                offset = update["update_id"] + 1
+
+
+async def serve_webhook(supervisor, path, secret, host, port):
+    if not secret:
+        raise RuntimeError("Для режима webhook задайте WEBHOOK_SECRET")
+
+    async def handle(request):
+        if not hmac.compare_digest(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), secret):
+            return web.Response(status=401)
+        supervisor.dispatch(await request.json())
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_post(path, handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+async def _run(settings, mode, workers):
+    import main
+
+    # Здесь приложение нужно только ради бота, роутера и миграций
+    app = main.create_app(settings)
+    # Миграции — один раз, до запуска обработчиков
+    await app.repo.init_db()
+    await app.repo.close()
+    allowed_updates = app.dp.resolve_used_update_types()
+
+    supervisor = Supervisor(workers)
+    await supervisor.start()
+    watcher = asyncio.create_task(supervisor.watch())
+
+    runner = None
+    ingress = None
+    if mode == "webhook":
+        if not settings.webhook_url or not settings.webhook_secret:
+            raise RuntimeError("Для режима webhook задайте WEBHOOK_URL и WEBHOOK_SECRET")
+        runner = await serve_webhook(supervisor, settings.webhook_path, settings.webhook_secret,
+                                     settings.webhook_host, settings.webhook_port)
+        await app.bot.set_webhook(settings.webhook_url.rstrip("/") + settings.webhook_path,
+                                  secret_token=settings.webhook_secret, allowed_updates=allowed_updates)
+    else:
+        ingress = asyncio.create_task(poll_updates(supervisor, app.bot, allowed_updates))
+    await app.ping_admin()
+    print(f"Бот A1 запущен: {mode}, обработчиков {workers}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        if ingress:
+            ingress.cancel()
+        if runner:
+            await runner.cleanup()
+        watcher.cancel()
+        await supervisor.stop()
+        await app.bot.session.close()
+
+
+def run(settings, mode, workers):
+    asyncio.run(_run(settings, mode, workers))
@@ -0,0 +1,125 @@
+import asyncio
+import itertools
+import os
+import sys
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import AnswerCallbackQuery, SendMessage
+from aiogram.types import Chat, Message
+
+from appointments import parse_appointment
+from keyboards import SlotCallback
+from settings import Settings
+
+TZ = ZoneInfo("Asia/Vladivostok")
+USER_ID = 500
+
+
+# === РАЗБОР ВРЕМЕНИ ЗАПИСИ ===
+def test_parse_appointment_formats():
+    now = datetime(2026, 10, 18, 12, 0, tzinfo=TZ)
+    assert parse_appointment("1 декабря, 10:00", now) == datetime(2026, 12, 1, 10, 0, tzinfo=TZ)
+    assert parse_appointment("01.12 10:00", now) == datetime(2026, 12, 1, 10, 0, tzinfo=TZ)
+    assert parse_appointment("05.01.27 9:30", now) == datetime(2027, 1, 5, 9, 30, tzinfo=TZ)
+    assert parse_appointment("завтра в 15:30", now) == datetime(2026, 10, 19, 15, 30, tzinfo=TZ)
+
+
+def test_parse_appointment_rolls_over_to_next_year():
+    now = datetime(2026, 12, 20, 12, 0, tzinfo=TZ)
+    assert parse_appointment("10 января 11:00", now) == datetime(2027, 1, 10, 11, 0, tzinfo=TZ)
+
+
+def test_parse_appointment_rejects_garbage():
+    now = datetime(2026, 10, 18, 12, 0, tzinfo=TZ)
+    assert parse_appointment("когда-нибудь", now) is None
+    assert parse_appointment("1 декабря", now) is None
+    assert parse_appointment("31.02 10:00", now) is None
+
+
+# === ДВОЙНОЕ НАЖАТИЕ КНОПКИ СЛОТА ===
+class RecordingSession(BaseSession):
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+        self.sent = []
+        self.alerts = []
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        await asyncio.sleep(self.latency)
+        if isinstance(method, SendMessage):
+            self.sent.append((int(method.chat_id), method.text))
+            return Message(message_id=next(self._message_ids), date=int(time.time()),
+                           chat=Chat(id=int(method.chat_id), type="private"), text=method.text)
+        if isinstance(method, AnswerCallbackQuery) and method.show_alert:
+            self.alerts.append(method.text)
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def _message(update_id, text):
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": int(time.time()), "text": text,
+        "chat": {"id": USER_ID, "type": "private"},
+        "from": {"id": USER_ID, "is_bot": False, "first_name": "Test", "username": "test"},
+    }}
+
+
+def _slot_tap(update_id, start):
+    return {"update_id": update_id, "callback_query": {
+        "id": str(update_id), "chat_instance": "1", "data": SlotCallback(at=start).pack(),
+        "from": {"id": USER_ID, "is_bot": False, "first_name": "Test", "username": "test"},
+        "message": {"message_id": 1, "date": int(time.time()), "text": "⏰",
+                    "chat": {"id": USER_ID, "type": "private"}},
+    }}
+
+
+async def _double_tap(tmp_path, latency):
+    import main
+
+    settings = Settings(bot_token="1:test", admin_id=1, db_path=str(tmp_path / "bot.db"),
+                        media_dir=str(tmp_path / "media"), metrics_port=0, metrics_log_interval=0)
+    session = RecordingSession(latency)
+    app = main.create_app(settings, session=session)
+    await app.start()
+    try:
+        steps = ["/start", "📸 Фото на документы", "1. Алеутская ул., 2а", "3×4 см (паспорт РФ)", "+79990000000"]
+        for update_id, text in enumerate(steps, 1):
+            await app.dp.feed_raw_update(app.bot, _message(update_id, text))
+        start = app.bookings.suggest("Алеутская улица, 2а")[0]
+        # Необработанное исключение в обработчике feed_raw_update пробрасывает
+        await asyncio.gather(app.dp.feed_raw_update(app.bot, _slot_tap(100, start)),
+                             app.dp.feed_raw_update(app.bot, _slot_tap(101, start)))
+        await app.notifier.close()
+        orders = await app.repo.run(lambda: app.repo.conn.execute(
+            "SELECT COUNT(*) FROM orders WHERE service = 'photo_id'").fetchone()[0])
+        return session, orders
+    finally:
+        await app.close()
+
+
+def _check_double_tap(session, orders):
+    replies = [text for chat_id, text in session.sent if chat_id == USER_ID]
+    assert orders == 1
+    assert sum("Запись подтверждена" in text for text in replies) == 1
+    assert not any("занято" in text for text in replies)
+    assert session.alerts == ["Эта запись уже оформлена или отменена."]
+
+
+def test_double_tap_on_slot_books_once(tmp_path):
+    _check_double_tap(*asyncio.run(_double_tap(tmp_path, latency=0.05)))
+
+
+def test_double_tap_on_slot_books_once_without_latency(tmp_path):
+    _check_double_tap(*asyncio.run(_double_tap(tmp_path, latency=0)))
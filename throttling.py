@@ -0,0 +1,111 @@
+import time
+from collections import OrderedDict
+
+from aiogram import BaseMiddleware
+
+USER_LIMIT = (20, 10.0)        # не больше 20 обновлений за 10 секунд
+GLOBAL_LIMIT = (300, 1.0)      # на всех пользователей вместе
+IDLE_TTL = 10 * 60             # через сколько забыть молчащего пользователя
+SLOW_DOWN_TEXT = "⏳ Слишком много сообщений подряд. Подождите немного и повторите."
+
+
+def parse_limit(value, default):
+    # "20/10" -> (20, 10.0): не больше 20 обновлений за 10 секунд
+    if not value:
+        return default
+    count, _, period = value.partition("/")
+    return int(count), float(period or 1)
+
+
+class SlidingWindow:
+    # Приближённое скользящее окно: счётчики текущего и прошлого окна,
+    # прошлое учитывается пропорционально оставшейся доле. O(1) памяти.
+    __slots__ = ("limit", "period", "started", "previous", "current", "warned")
+
+    def __init__(self, limit, period, now):
+        self.limit = limit
+        self.period = period
+        self.started = now
+        self.previous = 0
+        self.current = 0
+        self.warned = False
+
+    def hit(self, now):
+        elapsed = now - self.started
+        if elapsed >= self.period:
+            windows = int(elapsed // self.period)
+            self.previous = self.current if windows == 1 else 0
+            self.current = 0
+            self.started += windows * self.period
+            self.warned = False
+            elapsed = now - self.started
+        weight = 1 - elapsed / self.period
+        if self.previous * weight + self.current >= self.limit:
+            return False
+        self.current += 1
+        return True
+
+
+# === ЗАЩИТА ОТ ФЛУДА ===
+# Внешний middleware на сообщения: лимит на пользователя (свой для отдельных
+# состояний FSM) и общий лимит на бота. Лишние обновления не доходят до
+# обработчиков, пользователь один раз за окно получает просьбу притормозить.
+class ThrottlingMiddleware(BaseMiddleware):
+    def __init__(self, user_limit=USER_LIMIT, global_limit=GLOBAL_LIMIT, state_limits=None,
+                 idle_ttl=IDLE_TTL, text=SLOW_DOWN_TEXT):
+        self.user_limit = user_limit
+        self.global_limit = global_limit
+        self.state_limits = state_limits or {}
+        self.idle_ttl = idle_ttl
+        self.text = text
+        self._users = OrderedDict()
+        self._global = SlidingWindow(*global_limit, time.monotonic())
+        self.stats = {"passed": 0, "throttled_user": 0, "throttled_global": 0, "warned": 0, "evicted": 0}
+
+    @property
+    def active_users(self):
+        return len(self._users)
+
+    def _evict(self, now):
+        while self._users:
+            user_id, entry = next(iter(self._users.items()))
+            if now - entry[0] < self.idle_ttl:
+                break
+            del self._users[user_id]
+            self.stats["evicted"] += 1
+
+    def _window(self, user_id, rule, now):
+        entry = self._users.get(user_id)
+        if entry is None:
+            entry = self._users[user_id] = [now, {}]
+        else:
+            entry[0] = now
+            self._users.move_to_end(user_id)
+        limit, period = self.state_limits.get(rule, self.user_limit)
+        window = entry[1].get(rule)
+        if window is None:
+            window = entry[1][rule] = SlidingWindow(limit, period, now)
+        return window
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+        now = time.monotonic()
+        self._evict(now)
+
+        rule = data.get("raw_state") if data.get("raw_state") in self.state_limits else None
+        window = self._window(user.id, rule, now)
+        if not window.hit(now):
+            self.stats["throttled_user"] += 1
+            if not window.warned:
+                window.warned = True
+                self.stats["warned"] += 1
+                await event.answer(self.text)
+            return None
+        if not self._global.hit(now):
+            # Общая перегрузка: молча отбрасываем, чтобы не множить исходящие
+            self.stats["throttled_global"] += 1
+            return None
+        self.stats["passed"] += 1
+        return await handler(event, data)